@@ -0,0 +1,299 @@
+"""
+Evolve a `ParticleSystem` with an adaptive time step, chosen from the
+embedded error estimate of the Dormand-Prince 5(4) method, and with the
+times of events (such as a particle hitting the ground or the closest
+approach of two particles) located by root finding.
+"""
+
+import math
+
+import numpy as np
+
+from Integrators import dopriStep
+
+
+class Event:
+    """
+    An event that happens when a function of the system state crosses zero.
+
+    Parameters
+    ----------
+    function: callable
+        A function, function(system), returning a float that changes sign
+        when the event happens.
+    terminal: bool
+        If True (the default) the evolution stops at the event.
+    direction: int
+        If positive, only zero crossings from negative to positive values are
+        events; if negative, only crossings from positive to negative;
+        otherwise both.
+    name: str
+        A name for the event. Defaults to the function's name.
+    """
+
+    def __init__(self, function, terminal=True, direction=0, name=None):
+        if not callable(function):
+            raise TypeError("You have not supplied a valid function")
+        self.function = function
+        self.terminal = terminal
+        self.direction = direction
+        self.name = function.__name__ if name is None else name
+
+    def __call__(self, system):
+        return self.function(system)
+
+    def crossed(self, before, after):
+        """
+        Check whether the event happened between two function values.
+        """
+
+        if self.direction > 0:
+            return before < 0 <= after
+        if self.direction < 0:
+            return before > 0 >= after
+        return (before < 0 <= after) or (before > 0 >= after)
+
+
+def groundImpact(index=0, axis=1, height=0.0):
+    """
+    An event for particle `index` falling through the given height along an
+    axis (by default the y-axis, as in testParticle.py).
+    """
+
+    def ground(system):
+        return system.positions[index, axis] - height
+
+    return Event(ground, terminal=True, direction=-1, name="ground impact")
+
+
+def closestApproach(i, j, terminal=False):
+    """
+    An event for the closest approach of particles i and j, i.e., when the
+    rate of change of their separation changes from negative to positive.
+    """
+
+    def approach(system):
+        return np.dot(
+            system.positions[i] - system.positions[j],
+            system.velocities[i] - system.velocities[j],
+        )
+
+    return Event(approach, terminal=terminal, direction=1,
+                 name=f"closest approach {i}-{j}")
+
+
+def errorNorm(system, positions, velocities, rerror, verror, rtol, atol):
+    """
+    The root mean square of the error estimates, each scaled by the
+    tolerance atol + rtol * |value|. A step is accepted if this is at most
+    one.
+    """
+
+    rscale = atol + rtol * np.maximum(np.abs(system.positions),
+                                      np.abs(positions))
+    vscale = atol + rtol * np.maximum(np.abs(system.velocities),
+                                      np.abs(velocities))
+    return math.sqrt(
+        (np.sum((rerror / rscale)**2) + np.sum((verror / vscale)**2))
+        / (2 * rerror.size)
+    )
+
+
+def evolve(system, duration, deltaT, rtol=1e-9, atol=1e-9, maxstep=np.inf,
+           events=None, callback=None, eventtol=1e-12, maxsteps=10**7):
+    """
+    Evolve a system for a given duration with an adaptive time step. After
+    each step the step size is scaled by 0.9 (1 / error)^(1/5), limited to a
+    factor between 0.2 and 5, where the error is the estimated error
+    relative to the tolerances. Steps with an error greater than one (or
+    not finite) are repeated with a smaller step.
+
+    If an event function changes sign during a step, the event time is found
+    to within `eventtol` (relative to the step size) with the Illinois
+    method, re-taking the step from its start with trial step sizes.
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The system to evolve (in place).
+    duration: float
+        The length of time to simulate (s).
+    deltaT: float
+        The initial time step (s).
+    rtol: float
+        The relative tolerance for the positions and velocities.
+    atol: float
+        The absolute tolerance for the positions (m) and velocities (m/s).
+    maxstep: float
+        The largest allowed time step (s).
+    events: list
+        A list of `Event` objects.
+    callback: callable
+        A function, callback(system), called after every accepted step and
+        at every event.
+    eventtol: float
+        The tolerance on the event times, relative to the step size.
+    maxsteps: int
+        The maximum number of accepted steps.
+
+    Returns
+    -------
+    tuple
+        A list of (time, event name) tuples for the events that happened,
+        and the number of accepted and rejected steps. The next step size is
+        stored in the system's `nextStep` attribute, so a run can be
+        continued with the same steps as if it had not stopped.
+    """
+
+    events = [] if events is None else events
+    values = [event(system) for event in events]
+    found = []
+
+    end = system.time + duration
+    accepted = 0
+    rejected = 0
+    while system.time < end:
+        if accepted >= maxsteps:
+            raise ValueError("Maximum number of steps reached")
+
+        step = min(deltaT, maxstep, end - system.time)
+        positions, velocities, accelerations, rerror, verror = dopriStep(
+            system, step
+        )
+        error = errorNorm(system, positions, velocities, rerror, verror,
+                          rtol, atol)
+
+        # new step size (an error of zero means the step is exact, and a
+        # non-finite error, e.g. from an overflow, is shrunk as far as
+        # allowed)
+        if error == 0:
+            factor = 5.0
+        elif not math.isfinite(error):
+            factor = 0.2
+        else:
+            factor = min(5.0, max(0.2, 0.9 * error**-0.2))
+        deltaT = step * factor
+        if not error <= 1:
+            rejected += 1
+            continue
+
+        system.nextStep = deltaT
+        start = (system.positions.copy(), system.velocities.copy(),
+                 system.time)
+        setState(system, positions, velocities, accelerations,
+                 start[2] + step)
+        accepted += 1
+
+        newvalues = [event(system) for event in events]
+        crossed = [
+            i for i, event in enumerate(events)
+            if event.crossed(values[i], newvalues[i])
+        ]
+
+        if crossed:
+            times = [
+                locateEvent(system, start, step, events[i], values[i],
+                            newvalues[i], eventtol)
+                for i in crossed
+            ]
+
+            # stop at the earliest terminal event, if there is one
+            stop = min(
+                [t for i, t in zip(crossed, times) if events[i].terminal],
+                default=None,
+            )
+            for i, eventtime in zip(crossed, times):
+                if stop is None or eventtime <= stop:
+                    found.append((float(start[2] + eventtime), events[i].name))
+
+            if stop is not None:
+                restartStep(system, start, stop)
+                if callback is not None:
+                    callback(system)
+                break
+
+        values = newvalues
+        if callback is not None:
+            callback(system)
+
+    return found, accepted, rejected
+
+
+def setState(system, positions, velocities, accelerations, time):
+    """
+    Set the positions, velocities, accelerations and time of a system.
+    """
+
+    system.positions[:] = positions
+    system.velocities[:] = velocities
+    system.accelerations[:] = accelerations
+    system.accelerationPositions = system.positions.copy()
+    system.time = time
+
+
+def restartStep(system, start, step):
+    """
+    Put a system back to the start of a step and take a step of the given
+    size instead.
+    """
+
+    system.positions[:] = start[0]
+    system.velocities[:] = start[1]
+    positions, velocities, accelerations, _, _ = dopriStep(system, step)
+    setState(system, positions, velocities, accelerations, start[2] + step)
+
+
+def locateEvent(system, start, step, event, before, after, eventtol,
+                maxiter=200):
+    """
+    Find the time after the start of a step at which an event function
+    crosses zero, using the Illinois (modified regula falsi) method. The
+    system is left at the end of the original step. A ValueError is raised
+    if the time is not found within `maxiter` iterations (e.g., for an
+    event function that jumps rather than crossing zero smoothly).
+
+    Returns
+    -------
+    float
+        The time of the event after the start of the step.
+    """
+
+    end = (system.positions.copy(), system.velocities.copy(),
+           system.accelerations.copy(), system.time)
+
+    lo, hi = 0.0, step
+    flo, fhi = before, after
+    side = 0
+    niter = 0
+    while hi - lo > eventtol * step:
+        if niter == maxiter:
+            setState(system, *end)
+            raise ValueError(f"Event '{event.name}' not located within "
+                             f"{maxiter} iterations")
+        niter += 1
+
+        t = (lo * fhi - hi * flo) / (fhi - flo)
+        if not lo < t < hi:
+            t = 0.5 * (lo + hi)
+
+        restartStep(system, start, t)
+        ft = event(system)
+
+        if ft == 0:
+            lo = hi = t
+            break
+
+        if (ft < 0) == (flo < 0):
+            lo, flo = t, ft
+            if side == -1:
+                fhi /= 2
+            side = -1
+        else:
+            hi, fhi = t, ft
+            if side == 1:
+                flo /= 2
+            side = 1
+
+    setState(system, *end)
+
+    return hi
@@ -0,0 +1,402 @@
+"""
+A Barnes-Hut octree for calculating approximate gravitational accelerations
+of N particles in O(N log N) operations rather than the O(N^2) of direct
+summation.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# the arrays of an Octree used by `Octree.walk`, which are shared with worker
+# processes
+WALKARRAYS = ("positions", "masses", "start", "end", "childfirst",
+              "childlast", "leaf", "size", "mass", "com", "centre")
+
+# the tree attached by a worker process
+_worker = {}
+
+
+def spreadBits(x):
+    """
+    Spread the lowest 21 bits of each integer in x so that there are two zero
+    bits between each of them (used to interleave x, y and z coordinates).
+    """
+
+    x = x.astype(np.uint64) & np.uint64(0x1fffff)
+    for shift, mask in [
+        (32, 0x1f00000000ffff),
+        (16, 0x1f0000ff0000ff),
+        (8, 0x100f00f00f00f00f),
+        (4, 0x10c30c30c30c30c3),
+        (2, 0x1249249249249249),
+    ]:
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+
+def expandRanges(starts, counts):
+    """
+    Return the indices start, start + 1, ..., start + count - 1 for each pair
+    of values in `starts` and `counts`, concatenated into one array.
+    """
+
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(np.sum(counts))
+
+
+def _walk(name, layout, *args):
+    # worker task: walk the tree in the shared memory block with the given
+    # name, attaching it (and dropping the previous tree) on first use
+    if _worker.get("name") != name:
+        if "block" in _worker:
+            # the arrays must be released before the block can be closed
+            del _worker["tree"]
+            _worker.pop("block").close()
+
+        block = shared_memory.SharedMemory(name=name)
+        tree = Octree.__new__(Octree)
+        for attr, (offset, shape, dtype) in layout.items():
+            setattr(tree, attr, np.ndarray(shape, dtype=dtype,
+                                           buffer=block.buf, offset=offset))
+        _worker.update(name=name, block=block, tree=tree)
+
+    return _worker["tree"].walk(*args)
+
+
+class Octree:
+    """
+    A Barnes-Hut octree of particles. The particles are sorted along a
+    Z-order (Morton) curve, so each tree node holds a contiguous range of
+    sorted particles, and the tree is built one level at a time with array
+    operations.
+
+    Parameters
+    ----------
+    positions: array
+        An (N, 3) array of the particle positions.
+    masses: array
+        A length N array of the particle masses.
+    leafsize: int
+        The maximum number of particles in a leaf node. Defaults to 8.
+    maxdepth: int
+        The maximum depth of the tree (at most 21). Defaults to 21.
+    """
+
+    def __init__(self, positions, masses, leafsize=8, maxdepth=21):
+        if not 0 < maxdepth <= 21:
+            raise ValueError("The maximum depth must be between 1 and 21")
+
+        positions = np.asarray(positions, dtype=float)
+        masses = np.asarray(masses, dtype=float)
+        N = len(masses)
+
+        # bounding cube of the particles
+        lower = positions.min(axis=0)
+        rootsize = max(np.max(positions.max(axis=0) - lower), 1e-300) * (
+            1 + 1e-12
+        )
+
+        # integer cell coordinates at the deepest level and Morton keys
+        cells = np.minimum(
+            ((positions - lower) / rootsize * 2**maxdepth).astype(np.int64),
+            2**maxdepth - 1,
+        )
+        keys = (
+            spreadBits(cells[:, 0])
+            | (spreadBits(cells[:, 1]) << np.uint64(1))
+            | (spreadBits(cells[:, 2]) << np.uint64(2))
+        )
+
+        self.order = np.argsort(keys, kind="stable")
+        self.positions = positions[self.order]
+        self.masses = masses[self.order]
+        keys = keys[self.order]
+        cells = cells[self.order]
+
+        # cumulative sums for the masses and mass moments of particle ranges
+        cmass = np.concatenate([[0.0], np.cumsum(self.masses)])
+        cmoment = np.concatenate(
+            [np.zeros((1, 3)), np.cumsum(self.masses[:, None] * self.positions,
+                                         axis=0)]
+        )
+
+        starts = [np.array([0])]
+        ends = [np.array([N])]
+        childfirst = []
+        childlast = []
+        nnodes = 1  # number of nodes in all levels so far
+
+        level = 0
+        while True:
+            split = (ends[level] - starts[level] > leafsize) & (level < maxdepth)
+
+            first = np.full(len(starts[level]), nnodes)
+            last = np.full(len(starts[level]), nnodes)
+            if not np.any(split):
+                childfirst.append(first)
+                childlast.append(last)
+                break
+
+            # runs of particles sharing the same cell at the next level
+            prefix = keys >> np.uint64(3 * (maxdepth - level - 1))
+            runstarts = np.flatnonzero(
+                np.concatenate([[True], prefix[1:] != prefix[:-1]])
+            )
+            runends = np.append(runstarts[1:], N)
+
+            # keep the runs inside nodes that are being split
+            insplit = np.zeros(N + 1, dtype=int)
+            np.add.at(insplit, starts[level][split], 1)
+            np.add.at(insplit, ends[level][split], -1)
+            keep = np.cumsum(insplit)[runstarts] > 0
+
+            newstarts = runstarts[keep]
+            newends = runends[keep]
+
+            first[split] = nnodes + np.searchsorted(
+                newstarts, starts[level][split]
+            )
+            last[split] = nnodes + np.searchsorted(
+                newstarts, ends[level][split]
+            )
+            childfirst.append(first)
+            childlast.append(last)
+
+            starts.append(newstarts)
+            ends.append(newends)
+            nnodes += len(newstarts)
+            level += 1
+
+        levels = np.concatenate(
+            [np.full(len(s), i) for i, s in enumerate(starts)]
+        )
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.childfirst = np.concatenate(childfirst)
+        self.childlast = np.concatenate(childlast)
+        self.leaf = self.childfirst == self.childlast
+
+        self.size = rootsize / 2.0**levels
+        self.mass = cmass[self.end] - cmass[self.start]
+        self.com = (cmoment[self.end] - cmoment[self.start]) / np.where(
+            self.mass > 0, self.mass, 1.0
+        )[:, None]
+
+        # geometric centre of each node's cell
+        cellindex = cells[self.start] >> (maxdepth - levels)[:, None]
+        self.centre = lower + (cellindex + 0.5) * self.size[:, None]
+
+    def __len__(self):
+        return len(self.start)
+
+    def share(self):
+        """
+        Copy the arrays needed to walk the tree into a new shared memory
+        block, so worker processes can attach to it rather than each being
+        sent a copy of the tree.
+
+        Returns
+        -------
+        tuple
+            The SharedMemory block (which the caller must close and unlink)
+            and a dictionary of the (offset, shape, dtype) of each array in
+            it.
+        """
+
+        layout = {}
+        size = 0
+        for attr in WALKARRAYS:
+            array = getattr(self, attr)
+            layout[attr] = (size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // 8) * 8  # keep the arrays aligned
+
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for attr, (offset, shape, dtype) in layout.items():
+            np.ndarray(shape, dtype=dtype, buffer=block.buf,
+                       offset=offset)[...] = getattr(self, attr)
+
+        return block, layout
+
+    def walk(self, groups, theta, G, softening, potential=False,
+             maxpairs=2**20):
+        """
+        Calculate the accelerations of the particles in a set of leaf nodes
+        ("groups") by walking the tree. The particles in a group share one
+        interaction list, and all the group-node pairs at the same stage of
+        the walk are handled together: a node far enough away from the
+        group's cell (its size divided by the distance from its centre of
+        mass to the nearest point of the cell is less than theta) acts as a
+        point mass, otherwise it is opened and replaced by its children, or
+        by its particles if it is a leaf.
+
+        Parameters
+        ----------
+        groups: array
+            The indices of consecutive leaf nodes, sorted by their first
+            particle.
+        potential: bool
+            Whether to also sum the potential energy of the particles from
+            the same interactions.
+        maxpairs: int
+            The maximum number of particle-source interactions evaluated at
+            once, which bounds the memory used.
+
+        Returns
+        -------
+        tuple
+            An array of accelerations for the sorted particles covered by the
+            groups, and the sum of their potential energies (zero unless
+            `potential` is True).
+        """
+
+        first = self.start[groups[0]]
+        npart = self.end[groups[-1]] - first
+        accelerations = np.zeros((npart, 3))
+        energy = 0.0
+
+        def interact(g, sourcePositions, sourceMasses, sources):
+            # add the accelerations of the particles in groups g due to the
+            # given sources, in batches of at most maxpairs interactions
+            nonlocal energy
+            counts = self.end[groups[g]] - self.start[groups[g]]
+            batch = np.cumsum(counts) // maxpairs
+            bounds = np.flatnonzero(np.diff(batch, prepend=-1, append=-2))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                c = counts[lo:hi]
+                pp = expandRanges(self.start[groups[g[lo:hi]]], c)
+                jj = np.repeat(np.arange(lo, hi), c)
+
+                separation = sourcePositions[jj] - self.positions[pp]
+                distance2 = np.einsum("ij,ij->i", separation, separation)
+                distance2 += softening**2
+                distance2[sources[jj] == pp] = np.inf  # no self-forces
+
+                if potential:
+                    energy -= G * np.dot(
+                        sourceMasses[jj] * self.masses[pp],
+                        1.0 / np.sqrt(distance2),
+                    )
+
+                weights = G * sourceMasses[jj] / distance2**1.5
+                for k in range(3):
+                    accelerations[:, k] += np.bincount(
+                        pp - first, weights=weights * separation[:, k],
+                        minlength=npart,
+                    )
+
+        g = np.arange(len(groups))
+        n = np.zeros(len(groups), dtype=int)
+        while len(g):
+            offset = np.maximum(
+                np.abs(self.com[n] - self.centre[groups[g]])
+                - 0.5 * self.size[groups[g], None],
+                0.0,
+            )
+            distance2 = np.einsum("ij,ij->i", offset, offset)
+            accept = self.size[n]**2 < theta**2 * distance2
+
+            # far nodes act as point masses
+            interact(
+                g[accept],
+                self.com[n[accept]],
+                self.mass[n[accept]],
+                np.full(np.count_nonzero(accept), -1),
+            )
+
+            # opened leaves interact particle by particle
+            openleaf = ~accept & self.leaf[n]
+            counts = self.end[n[openleaf]] - self.start[n[openleaf]]
+            jj = expandRanges(self.start[n[openleaf]], counts)
+            interact(
+                np.repeat(g[openleaf], counts),
+                self.positions[jj],
+                self.masses[jj],
+                jj,
+            )
+
+            # opened internal nodes are replaced by their children
+            openint = ~accept & ~self.leaf[n]
+            counts = self.childlast[n[openint]] - self.childfirst[n[openint]]
+            n = expandRanges(self.childfirst[n[openint]], counts)
+            g = np.repeat(g[openint], counts)
+
+        return accelerations, energy
+
+    def accelerations(self, theta=0.5, G=6.6743e-11, softening=0.0,
+                      chunksize=4096, executor=None, potential=False):
+        """
+        Calculate the approximate gravitational acceleration of every
+        particle.
+
+        Parameters
+        ----------
+        theta: float
+            The opening angle. Smaller values are more accurate but slower,
+            with theta = 0 equivalent to direct summation. Defaults to 0.5.
+        G: float
+            The gravitational constant.
+        softening: float
+            A softening length added in quadrature to the separations.
+        chunksize: int
+            The approximate number of particles whose tree walks are handled
+            together.
+        executor: concurrent.futures.Executor
+            If given, the chunks of particles are shared between the
+            executor's workers, e.g., a ProcessPoolExecutor to use several
+            cores. The tree is passed to worker processes once, in shared
+            memory, and only the chunks are sent with each task.
+        potential: bool
+            If True, also calculate the approximate gravitational potential
+            energy of the system from the same interactions, and return
+            (accelerations, energy).
+
+        Returns
+        -------
+        array
+            An (N, 3) array of accelerations in the original particle order.
+        """
+
+        # leaf nodes in particle order, split into chunks of about chunksize
+        # particles
+        groups = np.flatnonzero(self.leaf)
+        groups = groups[np.argsort(self.start[groups])]
+        edges = np.searchsorted(
+            self.start[groups], np.arange(0, len(self.masses), chunksize)
+        )
+        chunks = [
+            groups[lo:hi]
+            for lo, hi in zip(edges, np.append(edges[1:], len(groups)))
+            if hi > lo
+        ]
+        args = (
+            chunks, [theta] * len(chunks), [G] * len(chunks),
+            [softening] * len(chunks), [potential] * len(chunks)
+        )
+
+        if executor is None:
+            results = list(map(self.walk, *args))
+        elif isinstance(executor, ProcessPoolExecutor):
+            block, layout = self.share()
+            try:
+                results = list(executor.map(
+                    _walk, [block.name] * len(chunks),
+                    [layout] * len(chunks), *args
+                ))
+            finally:
+                block.close()
+                block.unlink()
+        else:
+            # threads can use the tree directly
+            results = list(executor.map(self.walk, *args))
+
+        accelerations = np.empty((len(self.masses), 3))
+        accelerations[self.order] = np.concatenate([r[0] for r in results])
+
+        if potential:
+            # every pair is counted twice
+            return accelerations, 0.5 * sum(r[1] for r in results)
+
+        return accelerations
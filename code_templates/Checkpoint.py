@@ -0,0 +1,189 @@
+"""
+Save the full state of a simulation at regular intervals so that it can be
+restarted after a crash or when a batch job hits its time limit, and carry
+on exactly as if it had not been interrupted. For example:
+
+>>> checkpointer = Checkpointer("run.npz", everySeconds=600)
+>>> while system.time < end:
+...     system.update(deltaT)
+...     checkpointer(system)
+
+and to restart:
+
+>>> system = loadCheckpoint("run.npz")
+"""
+
+import io
+import json
+import time
+
+import numpy as np
+
+from ParticleSystem import ParticleSystem
+from Trajectory import writeAtomic
+
+
+# attributes that are not saved (the integrator is restored from its name and
+# executors cannot be saved)
+SKIP = ("integrator", "executor")
+
+
+class Checkpointer:
+    """
+    Save checkpoints of a particle system every so many steps and/or seconds
+    of wall-clock time. Call the object after every step (e.g., as the
+    callback of `AdaptiveStepping.evolve`).
+
+    Parameters
+    ----------
+    fname: str
+        The checkpoint file name. Each checkpoint replaces the last one.
+    everySteps: int
+        Save a checkpoint every `everySteps` steps.
+    everySeconds: float
+        Save a checkpoint if this many seconds have passed since the last one.
+    rng: numpy.random.Generator
+        A random number generator whose state is saved with the system.
+    recorder: TrajectoryRecorder
+        A trajectory recorder, which is flushed when a checkpoint is saved and
+        whose position is saved with the system.
+    """
+
+    def __init__(self, fname, everySteps=None, everySeconds=None, rng=None,
+                 recorder=None):
+        if everySteps is None and everySeconds is None:
+            raise ValueError("Give the checkpoint interval in steps and/or "
+                             "seconds")
+
+        self.fname = fname
+        self.everySteps = everySteps
+        self.everySeconds = everySeconds
+        self.rng = rng
+        self.recorder = recorder
+
+        self.nsteps = 0
+        self.lastsave = time.monotonic()
+
+    def __call__(self, system):
+        self.nsteps += 1
+
+        if (
+            (self.everySteps is not None
+             and self.nsteps % self.everySteps == 0)
+            or (self.everySeconds is not None
+                and time.monotonic() - self.lastsave >= self.everySeconds)
+        ):
+            self.save(system)
+
+    def save(self, system):
+        """
+        Save a checkpoint now. The file is written atomically.
+        """
+
+        if self.recorder is not None:
+            self.recorder.flush()
+
+        saveCheckpoint(self.fname, system, rng=self.rng,
+                       recorder=self.recorder)
+        self.lastsave = time.monotonic()
+
+
+def saveCheckpoint(fname, system, rng=None, recorder=None):
+    """
+    Save the state of a particle system (and optionally a random number
+    generator and trajectory recorder) to a NumPy ".npz" file. Array
+    attributes of the system are stored as uncompressed arrays, so they are
+    restored bit-for-bit, and all other attributes are stored as JSON.
+
+    Parameters
+    ----------
+    fname: str
+        The output file name.
+    system: ParticleSystem
+        The system to save.
+    rng: numpy.random.Generator
+        A random number generator to save the state of.
+    recorder: TrajectoryRecorder
+        A trajectory recorder to save the position of. It should have been
+        flushed.
+    """
+
+    arrays = {}
+    attributes = {}
+    for name, value in vars(system).items():
+        if name in SKIP:
+            continue
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+        else:
+            attributes[name] = value
+
+    extra = {"attributes": attributes}
+    if rng is not None:
+        extra["rng"] = rng.bit_generator.state
+    if recorder is not None:
+        extra["recorder"] = {
+            "ncalls": recorder.ncalls,
+            "nchunks": len(recorder.meta["chunks"]),
+        }
+
+    # store the JSON as an array of bytes
+    arrays["json"] = np.frombuffer(
+        json.dumps(extra, default=int).encode("utf-8"), dtype=np.uint8
+    )
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    writeAtomic(fname, lambda fp: fp.write(buffer.getvalue()))
+
+
+def loadCheckpoint(fname, rng=None, recorder=None):
+    """
+    Load a particle system from a checkpoint file.
+
+    Parameters
+    ----------
+    fname: str
+        The checkpoint file name.
+    rng: numpy.random.Generator
+        A random number generator whose state is set to the saved state.
+    recorder: TrajectoryRecorder
+        A trajectory recorder opened with `append=True` on the same
+        directory as when the checkpoint was saved. Any records written after
+        the checkpoint are discarded so that they are not duplicated.
+
+    Returns
+    -------
+    ParticleSystem
+        The restored system.
+    """
+
+    with np.load(fname) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    extra = json.loads(arrays.pop("json").tobytes().decode("utf-8"))
+
+    system = ParticleSystem.__new__(ParticleSystem)
+    for name, value in extra["attributes"].items():
+        setattr(system, name, value)
+    for name, value in arrays.items():
+        setattr(system, name, value)
+
+    system.setIntegrator(system.integratorName)
+    system.executor = None
+
+    if rng is not None:
+        if "rng" not in extra:
+            raise ValueError("The checkpoint does not contain an RNG state")
+        rng.bit_generator.state = extra["rng"]
+
+    if recorder is not None:
+        if "recorder" not in extra:
+            raise ValueError("The checkpoint does not contain a recorder "
+                             "state")
+        del recorder.meta["chunks"][extra["recorder"]["nchunks"]:]
+        recorder.writeMeta()
+        recorder.ncalls = extra["recorder"]["ncalls"]
+        recorder.nbuffered = 0
+
+    return system
@@ -0,0 +1,261 @@
+"""
+Monitor the conservation of energy, linear momentum and angular momentum
+while a simulation runs, as a check on the accuracy of the integrator and
+force solver. For example:
+
+>>> monitor = ConservationMonitor(system, every=100, fname="run.cons")
+>>> for i in range(100000):
+...     system.update(deltaT)
+...     monitor(system)
+>>> monitor.close()
+>>> log = readConservationLog("run.cons")
+>>> plt.semilogy(log["times"], np.abs(log["energyDrift"]))
+
+The potential energy, which would otherwise need its own O(N^2) sum over
+pairs, is calculated by the force solver from the separations it already
+uses, so the monitor costs little more than the kinetic energy and momenta.
+This only works for integrators that end a step with a force evaluation at
+the final positions (e.g., "verlet"). For the others (e.g., "leapfrog",
+"yoshida4" and "rk4") the potential is calculated separately for each
+sample, although this is not counted in the system's `forceEvaluations`.
+"""
+
+import numpy as np
+
+from BarnesHut import Octree
+
+
+# columns of each row of the log: time, total energy, linear momentum (3) and
+# angular momentum (3). The log starts with a header row holding NaN and the
+# momentum and angular momentum scales (see `ConservationMonitor`).
+NCOLUMNS = 8
+
+
+def drifts(rows, initial, momentumScale, angularMomentumScale):
+    """
+    Calculate the drifts of the conserved quantities in rows of the log from
+    their initial values: the energy drift is relative to the initial energy
+    and the momentum drifts are relative to the given scales.
+
+    Returns
+    -------
+    tuple
+        The energy, momentum and angular momentum drifts.
+    """
+
+    rows = np.asarray(rows)
+    return (
+        (rows[..., 1] - initial[1]) / abs(initial[1]),
+        np.linalg.norm(rows[..., 2:5] - initial[2:5], axis=-1)
+        / momentumScale,
+        np.linalg.norm(rows[..., 5:8] - initial[5:8], axis=-1)
+        / angularMomentumScale,
+    )
+
+
+def scales(system):
+    """
+    Return natural scales for the momentum and angular momentum of a system,
+    against which their drifts are measured. These are the total mass times
+    the root mean square speed that the kinetic energy plus the magnitude of
+    the potential energy would give, and that times the root mean square
+    distance from the origin. Unlike the totals, these are not zero for a
+    system whose total momentum is zero or that starts at rest. A scale that
+    is still zero is replaced by one, so that drift is absolute.
+    """
+
+    mass = np.sum(system.masses)
+    speed = np.sqrt(
+        2 * (system.kineticEnergy() + abs(system.potential)) / mass
+    )
+    radius = np.sqrt(
+        np.sum(system.masses * np.sum(system.positions**2, axis=1)) / mass
+    )
+
+    momentumScale = mass * speed
+    angularMomentumScale = momentumScale * radius
+    return (momentumScale or 1.0, angularMomentumScale or 1.0)
+
+
+def potentialEnergy(system):
+    """
+    Calculate the potential energy of a system at its current positions with
+    its force solver, without counting a force evaluation.
+    """
+
+    if system.forceSolver == "barneshut":
+        _, energy = Octree(system.positions, system.masses).accelerations(
+            theta=system.theta, G=system.G, softening=system.softening,
+            executor=system.executor, potential=True,
+        )
+        return energy - np.sum(
+            system.masses * (system.positions @ system.externalAcceleration)
+        )
+
+    return system.potentialEnergy()
+
+
+class ConservationMonitor:
+    """
+    Record the conserved quantities of a particle system every so many steps.
+    Call the object after every step (e.g., as the callback of
+    `AdaptiveStepping.evolve`).
+
+    The drifts relative to the values when the monitor was created are kept
+    in the `energyDrift`, `momentumDrift` and `angularMomentumDrift`
+    attributes: the energy drift is relative to the initial energy, and the
+    momentum drifts are relative to the scales given by `scales`, which are
+    not zero even when the totals are.
+
+    The number of samples for which the potential energy had to be
+    calculated separately (see above) is kept in `potentialEvaluations`.
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The system being monitored.
+    every: int
+        Sample the conserved quantities every `every` steps. Defaults to 100.
+    fname: str
+        If given, the momentum scales and then each sample are appended to
+        this file as rows of NCOLUMNS float64 values (see
+        `readConservationLog`).
+    blocksize: int
+        The number of samples buffered before they are written to the file.
+        Defaults to 100.
+    """
+
+    def __init__(self, system, every=100, fname=None, blocksize=100):
+        if every < 1 or blocksize < 1:
+            raise ValueError("every and blocksize must be positive integers")
+
+        self.every = every
+        self.fname = fname
+        self.blocksize = blocksize
+        self.nsteps = 0
+
+        self.potentialEvaluations = 0
+        self.updatePotential(system)
+        self.momentumScale, self.angularMomentumScale = scales(system)
+
+        self.buffer = np.empty((blocksize, NCOLUMNS))
+        self.nbuffered = 0
+        if fname is not None:
+            header = np.zeros(NCOLUMNS)
+            header[:3] = np.nan, self.momentumScale, self.angularMomentumScale
+            with open(fname, "wb") as fp:
+                header.tofile(fp)
+
+        self.initial = self.sample(system)
+        self.drifts(self.initial)
+
+        # ask the force solver for the potential energy in time for the first
+        # sample
+        system.computePotential = every == 1
+
+    def __call__(self, system):
+        self.nsteps += 1
+
+        if self.nsteps % self.every == 0:
+            self.drifts(self.sample(system))
+
+        # the integrators calculate the accelerations at the end of a step
+        # during the step itself (or at the start of the next), so the
+        # potential is requested from the step before each sample
+        system.computePotential = (self.nsteps + 1) % self.every == 0
+
+    def sample(self, system):
+        """
+        Calculate and log the conserved quantities of the system now.
+
+        Returns
+        -------
+        array
+            The row added to the log.
+        """
+
+        self.updatePotential(system)
+
+        row = np.empty(NCOLUMNS)
+        row[0] = system.time
+        row[1] = system.kineticEnergy() + system.potential
+        row[2:5] = system.linearMomentum()
+        row[5:8] = system.angularMomentum()
+
+        self.buffer[self.nbuffered] = row
+        self.nbuffered += 1
+        if self.nbuffered == self.blocksize:
+            self.flush()
+
+        return row
+
+    def updatePotential(self, system):
+        """
+        Make sure the system's `potential` is for its current positions,
+        calculating it if the force solver has not already done so.
+        """
+
+        if not (
+            system.potentialPositions is not None
+            and np.array_equal(system.potentialPositions, system.positions)
+        ):
+            system.potential = potentialEnergy(system)
+            system.potentialPositions = system.positions.copy()
+            self.potentialEvaluations += 1
+
+    def drifts(self, row):
+        drift = drifts(row, self.initial, self.momentumScale,
+                       self.angularMomentumScale)
+        self.energyDrift, self.momentumDrift, self.angularMomentumDrift = drift
+
+    def flush(self):
+        """
+        Append any buffered samples to the log file.
+        """
+
+        if self.fname is not None and self.nbuffered:
+            with open(self.fname, "ab") as fp:
+                self.buffer[:self.nbuffered].tofile(fp)
+        self.nbuffered = 0
+
+    def close(self):
+        self.flush()
+
+
+def readConservationLog(fname):
+    """
+    Read a log written by a `ConservationMonitor`.
+
+    Parameters
+    ----------
+    fname: str
+        The log file name.
+
+    Returns
+    -------
+    dict
+        Arrays of the "times", "energy", "momentum" and "angularMomentum"
+        (the last two with shape (n, 3)) and of the "energyDrift",
+        "momentumDrift" and "angularMomentumDrift" relative to the first
+        sample, normalised as by the monitor.
+    """
+
+    log = np.fromfile(fname, dtype=np.float64)
+    log = log[:len(log) - len(log) % NCOLUMNS].reshape(-1, NCOLUMNS)
+    if len(log) < 2 or not np.isnan(log[0, 0]):
+        raise ValueError(f"{fname} is not a conservation log")
+
+    header, log = log[0], log[1:]
+    energyDrift, momentumDrift, angularMomentumDrift = drifts(
+        log, log[0], header[1], header[2]
+    )
+
+    return {
+        "times": log[:, 0],
+        "energy": log[:, 1],
+        "momentum": log[:, 2:5],
+        "angularMomentum": log[:, 5:8],
+        "energyDrift": energyDrift,
+        "momentumDrift": momentumDrift,
+        "angularMomentumDrift": angularMomentumDrift,
+    }
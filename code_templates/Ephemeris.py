@@ -0,0 +1,338 @@
+"""
+Initial conditions for Solar System simulations from JPL Horizons vector
+table files (see the "Solar System ephemerides" section of the gravity
+project notes), read entirely from local files.
+
+The text files are parsed once into a binary cache, which holds the epochs
+and states of every body in single arrays with an index giving each body's
+range of rows, so later runs load them in milliseconds. A file is parsed
+again only if it has changed since the cache was written. For example:
+
+>>> ephemeris = Ephemeris("horizons")  # a directory of Horizons .txt files
+>>> ephemeris.bodies()
+['earth', 'jupiter', 'sun', 'venus']
+>>> system = ephemeris.system(["sun", "venus", "earth"], 2459150.5)
+"""
+
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+from ParticleSystem import ParticleSystem
+from Trajectory import writeAtomic
+
+
+AU = 1.495978707e11  # astronomical unit (m)
+DAY = 86400.0  # day (s)
+
+# conversion factors to metres and metres per second for the output units
+UNITS = {
+    "KM-S": (1e3, 1e3),
+    "KM-D": (1e3, 1e3 / DAY),
+    "AU-D": (AU, AU / DAY),
+}
+
+CACHEFILE = "ephemeris.npz"
+
+# the component names in the vector table
+COMPONENTS = ("X", "Y", "Z", "VX", "VY", "VZ")
+
+
+def parseHorizons(fname):
+    """
+    Parse a JPL Horizons vector table ("state vector" output) text file.
+    Both the default layout and the CSV layout are understood.
+
+    Parameters
+    ----------
+    fname: str
+        The file name.
+
+    Returns
+    -------
+    dict
+        The target body's "name" and Horizons "id", its "GM" (m^3/s^2, or
+        None if it is not in the file), the "centre" and reference "frame"
+        of the coordinates, the "epochs" (Julian dates, TDB) and an
+        (n, 6) array of "states" (positions in m and velocities in m/s).
+    """
+
+    with open(fname, encoding="utf-8") as fp:
+        text = fp.read()
+
+    def header(pattern):
+        match = re.search(pattern, text, re.MULTILINE)
+        return match.group(1).strip() if match is not None else None
+
+    target = header(r"^Target body name:\s*(.*?)\s*\{")
+    if target is None:
+        raise ValueError(f"{fname} is not a JPL Horizons ephemeris file")
+    match = re.match(r"(.*?)\s*\((-?\d+)\)$", target)
+    name, bodyid = (match.group(1), int(match.group(2))) if match else (
+        target, None
+    )
+
+    gm = header(r"GM[, (]*km\^3/s\^2\)?\s*=\s*([-+0-9.Ee]+)")
+
+    units = header(r"^Output units\s*:\s*(\S+)")
+    if units not in UNITS:
+        raise ValueError(f"Unrecognised output units '{units}' in {fname}")
+    lengthscale, speedscale = UNITS[units]
+
+    start = text.find("$$SOE")
+    end = text.find("$$EOE")
+    if start < 0 or end < 0:
+        raise ValueError(f"No ephemeris data ($$SOE to $$EOE) in {fname}")
+
+    epochs = []
+    states = []
+    for line in text[start + 5:end].splitlines():
+        if not line.strip():
+            continue
+
+        if "," in line:
+            # CSV layout: JD, date, X, Y, Z, VX, VY, VZ, ...
+            fields = line.split(",")
+            epochs.append(float(fields[0]))
+            states.append([float(f) for f in fields[2:8]])
+            continue
+
+        match = re.match(r"\s*(\d+\.\d*)\s*=", line)
+        if match:
+            epochs.append(float(match.group(1)))
+            states.append([np.nan] * 6)
+            continue
+
+        for key, value in re.findall(r"([A-Z]+)\s*=\s*([-+0-9.Ee]+)", line):
+            if key in COMPONENTS and states:
+                states[-1][COMPONENTS.index(key)] = float(value)
+
+    states = np.array(states, dtype=float).reshape(-1, 6)
+    if len(states) == 0 or np.any(np.isnan(states)):
+        raise ValueError(f"Missing state vector components in {fname}")
+    states[:, :3] *= lengthscale
+    states[:, 3:] *= speedscale
+
+    epochs = np.array(epochs)
+    order = np.argsort(epochs, kind="stable")
+
+    return {
+        "name": name,
+        "id": bodyid,
+        "GM": float(gm) * 1e9 if gm is not None else None,
+        "centre": header(r"^Center body name:\s*(.*?)\s*(?:\{|$)"),
+        "frame": header(r"^Reference frame\s*:\s*(.*)$"),
+        "epochs": epochs[order],
+        "states": states[order],
+    }
+
+
+class Ephemeris:
+    """
+    The states of Solar System bodies from a directory of JPL Horizons
+    vector table files, with a binary cache.
+
+    Parameters
+    ----------
+    dirname: str
+        The directory containing the Horizons files (with a ".txt"
+        extension).
+    cachefile: str
+        The cache file name. Defaults to `CACHEFILE` in `dirname`.
+    """
+
+    def __init__(self, dirname, cachefile=None):
+        self.dirname = dirname
+        self.cachefile = cachefile or os.path.join(dirname, CACHEFILE)
+        self.load()
+
+    def load(self):
+        """
+        Load the cache, parsing any files that are new or have changed since
+        it was written and rewriting it if necessary.
+        """
+
+        sources = {}
+        for fname in sorted(glob.glob(os.path.join(self.dirname, "*.txt"))):
+            stat = os.stat(fname)
+            sources[os.path.basename(fname)] = [stat.st_size,
+                                                stat.st_mtime_ns]
+
+        index = {}
+        epochs = np.empty(0)
+        states = np.empty((0, 6))
+        if os.path.exists(self.cachefile):
+            with np.load(self.cachefile) as data:
+                index = json.loads(data["json"].tobytes().decode("utf-8"))
+                epochs = data["epochs"]
+                states = data["states"]
+
+        cached = {body["file"]: body for body in index.values()}
+        if all(
+            fname in cached and cached[fname]["source"] == source
+            for fname, source in sources.items()
+        ) and len(cached) == len(sources):
+            self.index, self.epochs, self.states = index, epochs, states
+            return
+
+        # rebuild the cache, reusing the rows of unchanged files
+        newindex = {}
+        blocks = []
+        rows = 0
+        for fname, source in sources.items():
+            body = cached.get(fname)
+            if body is not None and body["source"] == source:
+                first, count = body["first"], body["count"]
+                block = (epochs[first:first + count],
+                         states[first:first + count])
+                body = dict(body)
+            else:
+                parsed = parseHorizons(os.path.join(self.dirname, fname))
+                block = (parsed.pop("epochs"), parsed.pop("states"))
+                body = dict(parsed, file=fname, source=source)
+
+            key = body["name"].lower()
+            if key in newindex:
+                raise ValueError(f"{fname} and {newindex[key]['file']} are "
+                                 f"both ephemerides of {body['name']}")
+
+            body["first"] = rows
+            body["count"] = len(block[0])
+            rows += body["count"]
+            newindex[key] = body
+            blocks.append(block)
+
+        self.index = newindex
+        self.epochs = np.concatenate([b[0] for b in blocks] + [np.empty(0)])
+        self.states = np.concatenate(
+            [b[1] for b in blocks] + [np.empty((0, 6))]
+        )
+
+        arrays = {
+            "epochs": self.epochs,
+            "states": self.states,
+            "json": np.frombuffer(json.dumps(self.index).encode("utf-8"),
+                                  dtype=np.uint8),
+        }
+        writeAtomic(self.cachefile, lambda fp: np.savez(fp, **arrays))
+
+    def bodies(self):
+        """
+        Return a sorted list of the (lower case) names of the bodies.
+        """
+
+        return sorted(self.index)
+
+    def body(self, name):
+        """
+        Return the index entry for a body (its name, Horizons id, GM, centre,
+        frame and source file).
+        """
+
+        try:
+            return self.index[name.lower()]
+        except KeyError:
+            raise ValueError(f"No ephemeris for '{name}'. Bodies are "
+                             f"{', '.join(self.bodies())}.") from None
+
+    def state(self, name, epoch):
+        """
+        Return the position (m) and velocity (m/s) of a body at an epoch
+        (Julian date, TDB). Between the tabulated epochs the state is found
+        by cubic Hermite interpolation of the positions and velocities.
+
+        Parameters
+        ----------
+        name: str
+            The body name (case is ignored).
+        epoch: float
+            The Julian date.
+
+        Returns
+        -------
+        tuple
+            The position and velocity arrays.
+        """
+
+        body = self.body(name)
+        epochs = self.epochs[body["first"]:body["first"] + body["count"]]
+        states = self.states[body["first"]:body["first"] + body["count"]]
+
+        i = np.searchsorted(epochs, epoch)
+        if i < len(epochs) and epochs[i] == epoch:
+            return states[i, :3].copy(), states[i, 3:].copy()
+        if i == 0 or i == len(epochs):
+            raise ValueError(
+                f"Epoch {epoch} is outside the range of the ephemeris of "
+                f"{body['name']} ({epochs[0]} to {epochs[-1]})"
+            )
+
+        # cubic Hermite interpolation on [epochs[i - 1], epochs[i]]
+        h = (epochs[i] - epochs[i - 1]) * DAY
+        s = (epoch - epochs[i - 1]) * DAY / h
+        r0, v0 = states[i - 1, :3], states[i - 1, 3:] * h
+        r1, v1 = states[i, :3], states[i, 3:] * h
+
+        position = (
+            (2 * s**3 - 3 * s**2 + 1) * r0 + (s**3 - 2 * s**2 + s) * v0
+            + (-2 * s**3 + 3 * s**2) * r1 + (s**3 - s**2) * v1
+        )
+        velocity = (
+            (6 * s**2 - 6 * s) * r0 + (3 * s**2 - 4 * s + 1) * v0
+            + (-6 * s**2 + 6 * s) * r1 + (3 * s**2 - 2 * s) * v1
+        ) / h
+
+        return position, velocity
+
+    def system(self, names, epoch, masses=None, **kwargs):
+        """
+        Create a `ParticleSystem` of bodies at an epoch.
+
+        Parameters
+        ----------
+        names: list
+            The body names.
+        epoch: float
+            The Julian date (TDB).
+        masses: dict
+            Masses (kg) for bodies whose files do not give GM, or to override
+            it.
+        kwargs:
+            Other arguments passed to `ParticleSystem`.
+
+        Returns
+        -------
+        ParticleSystem
+            The system, with the particles named as in the ephemeris files.
+        """
+
+        masses = {k.lower(): v for k, v in (masses or {}).items()}
+
+        bodies = [self.body(name) for name in names]
+        for key in ("centre", "frame"):
+            if len({body[key] for body in bodies}) > 1:
+                raise ValueError(f"The ephemerides do not all have the same "
+                                 f"coordinate {key}")
+
+        positions = []
+        velocities = []
+        systemmasses = []
+        for name, body in zip(names, bodies):
+            position, velocity = self.state(name, epoch)
+            positions.append(position)
+            velocities.append(velocity)
+
+            if name.lower() in masses:
+                systemmasses.append(masses[name.lower()])
+            elif body["GM"] is not None:
+                systemmasses.append(body["GM"] / ParticleSystem.G)
+            else:
+                raise ValueError(f"The mass of {body['name']} is not known. "
+                                 f"Give it in the masses argument.")
+
+        return ParticleSystem(positions, velocities, systemmasses,
+                              names=[body["name"] for body in bodies],
+                              **kwargs)
@@ -1,4 +1,10 @@
 import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 
 class Integration:
@@ -11,12 +17,20 @@ class Integration:
         The function to be integrated.
     method: int
         An integer defining the integration method to use: 1 is trapezium rule,
-        2 is left rectangle rule, 3 is centre rectangle. Default is to use the
-        trapezium rule.
+        2 is left rectangle rule, 3 is centre rectangle, 4 is Romberg
+        (Richardson extrapolation of the trapezium rule). Default is to use
+        the trapezium rule.
     eps: float
         A value defining the absolute precision of the integration.
     """
 
+    # maximum number of intervals used before giving up on reaching eps
+    MAXN = 2**24
+
+    # maximum number of sample points passed to the function in one call when
+    # evaluating a batch of integrals
+    CHUNKSIZE = 2**20
+
     def __init__(self, function, method=1, eps=1e-5):
         self.setFunction(function)
         self.setEPS(eps)
@@ -41,11 +55,15 @@ class Integration:
             self.integrationMethod = self.lrect
         elif method == 3:
             self.integrationMethod = self.crect
+        elif method == 4:
+            self.integrationMethod = self.romberg
         else:
             raise ValueError(
                 "Unrecognised integration method. Method must be 1 "
-                "(trapezoid), 2 (left rectangle), or 3 (centre rectangle)."
+                "(trapezoid), 2 (left rectangle), 3 (centre rectangle), or 4 "
+                "(Romberg)."
             )
+        self.method = method
 
     def setEPS(self, eps):
         if eps <= 0:
@@ -54,7 +72,114 @@ class Integration:
 
     def evaluate(self, a, b):
         """
-        Evaluate the integral between the ranges a and b.
+        Evaluate the integral between the ranges a and b. The number of
+        intervals is doubled until two successive estimates agree to within
+        the absolute precision `eps`. Function values from earlier passes are
+        reused, so each doubling only evaluates the function at the new
+        midpoints. The total number of function evaluations is stored in the
+        `nevals` attribute and the time taken in seconds in `walltime`.
+
+        If `a` or `b` are arrays then a batch of integrals is evaluated, one
+        for each pair of bounds. In this case the function must accept a NumPy
+        array and return an array of the same shape, as all the sample points
+        are passed to it in a few large calls rather than one at a time.
+
+        Parameters
+        ----------
+        a: (int, float, array)
+            The lower bound(s) of the integral.
+        b: (int, float, array)
+            The upper bound(s) of the integral.
+
+        Return
+        ------
+        (float, array):
+            The result of the integral, or an array of results with the
+            broadcast shape of `a` and `b`.
+        """
+
+        if np.ndim(a) > 0 or np.ndim(b) > 0:
+            return self.evaluateArray(a, b)
+
+        if a >= b:
+            raise ValueError(
+                "The lower bound is greater than or equal to the upper bound"
+            )
+
+        start = time.perf_counter()
+        f = self.functionToBeIntegrated
+
+        def midsum(a, b, N):
+            # the integrals are passed in as length one arrays
+            self.nevals += N
+            return np.array([self.crect(a[0], b[0], N, f)])
+
+        self.nevals = 2
+        result = self.refine(
+            np.array([a], dtype=float),
+            np.array([b], dtype=float),
+            np.array([f(a)], dtype=float),
+            np.array([f(b)], dtype=float),
+            midsum,
+        )
+        self.walltime = time.perf_counter() - start
+
+        return float(result[0])
+
+    def evaluateArray(self, a, b):
+        """
+        Evaluate a batch of integrals with a vectorised integrand. Integrals
+        that have converged are dropped from later refinements.
+
+        Parameters
+        ----------
+        a: array
+            The lower bounds of the integrals.
+        b: array
+            The upper bounds of the integrals.
+
+        Return
+        ------
+        array:
+            The results of the integrals.
+        """
+
+        a, b = np.broadcast_arrays(
+            np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        )
+        shape = a.shape
+        a = a.ravel()
+        b = b.ravel()
+
+        if np.any(a >= b):
+            raise ValueError(
+                "A lower bound is greater than or equal to the upper bound"
+            )
+
+        start = time.perf_counter()
+        f = self.functionToBeIntegrated
+
+        def midsum(a, b, N):
+            self.nevals += len(a) * N
+            return self.vcrect(a, b, N, f)
+
+        self.nevals = 2 * len(a)
+        result = self.refine(a, b, f(a), f(b), midsum)
+        self.walltime = time.perf_counter() - start
+
+        return result.reshape(shape)
+
+    def evaluateAdaptive(self, a, b, processes=1):
+        """
+        Evaluate the integral between a and b with locally adaptive Simpson
+        quadrature. Rather than refining the whole range uniformly, a
+        sub-interval is only split if its error estimate exceeds its share of
+        `eps` (proportional to its width), so samples are concentrated where
+        the function varies rapidly, e.g., around a sharp peak.
+
+        The number of function evaluations is stored in the `nevals`
+        attribute and the time taken in seconds in `walltime`, for comparison
+        with `evaluate`.
 
         Parameters
         ----------
@@ -62,6 +187,12 @@ class Integration:
             The lower bound of the integral.
         b: (int, float)
             The upper bound of the integral.
+        processes: int
+            The number of worker processes to share the sub-intervals between.
+            If None, all available cores are used. The default is 1, i.e., no
+            worker processes. When using more than one process, the function
+            must be picklable (e.g., defined at the top level of a module
+            rather than a lambda).
 
         Return
         ------
@@ -74,16 +205,267 @@ class Integration:
                 "The lower bound is greater than or equal to the upper bound"
             )
 
-        result = float('nan')
+        start = time.perf_counter()
+        f = self.functionToBeIntegrated
+
+        intervals = [(a, b, f(a), f(0.5 * (a + b)), f(b), self.eps, 0)]
+
+        if processes == 1:
+            result, self.nevals, _ = self.adaptiveSimpson(f, intervals)
+        else:
+            if processes is None:
+                processes = os.cpu_count()
+
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                # split breadth-first until there are enough independent
+                # sub-intervals to keep all the workers busy
+                result, self.nevals, pending = self.adaptiveSimpson(
+                    f, intervals, maxpending=4 * processes
+                )
+
+                # the workers take sub-intervals from a shared queue as they
+                # become free, so the load is balanced if some sub-intervals
+                # need far more refinement than others
+                futures = [
+                    executor.submit(self.adaptiveSimpson, f, [interval])
+                    for interval in pending
+                ]
+                for future in futures:
+                    subresult, nevals, _ = future.result()
+                    result += subresult
+                    self.nevals += nevals
+
+        self.nevals += 3
+        self.walltime = time.perf_counter() - start
+
         return result
 
+    @staticmethod
+    def adaptiveSimpson(f, intervals, maxdepth=50, maxpending=None):
+        """
+        Adaptive Simpson quadrature over a list of sub-intervals. Each
+        sub-interval is compared with the sum of its two halves: if they
+        agree to within its tolerance (the Richardson error estimate) then
+        the extrapolated sum is accepted, otherwise both halves are added
+        back to be refined with half the tolerance each.
+
+        Parameters
+        ----------
+        f: callable
+            The function to be integrated.
+        intervals: list
+            A list of tuples (a, b, f(a), f(m), f(b), eps, depth) giving the
+            sub-interval bounds, the function values at the ends and midpoint
+            m, the absolute tolerance, and the number of splits so far.
+        maxdepth: int
+            The maximum number of times a sub-interval can be split.
+        maxpending: int
+            If given, stop once this many sub-intervals are waiting to be
+            refined. The sub-intervals are refined breadth-first in this case
+            and depth-first otherwise.
+
+        Return
+        ------
+        tuple:
+            The sum of the accepted sub-interval integrals, the number of
+            function evaluations, and a list of the sub-intervals still
+            waiting to be refined.
+        """
+
+        accepted = []
+        nevals = 0
+        pending = deque(intervals)
+
+        while pending:
+            if maxpending is not None and len(pending) >= maxpending:
+                break
+
+            a, b, fa, fm, fb, eps, depth = (
+                pending.popleft() if maxpending is not None else pending.pop()
+            )
+
+            m = 0.5 * (a + b)
+            fl = f(0.5 * (a + m))
+            fr = f(0.5 * (m + b))
+            nevals += 2
+
+            whole = (b - a) * (fa + 4 * fm + fb) / 6
+            left = (m - a) * (fa + 4 * fl + fm) / 6
+            right = (b - m) * (fm + 4 * fr + fb) / 6
+            delta = left + right - whole
+
+            if abs(delta) <= 15 * eps or depth >= maxdepth:
+                accepted.append(left + right + delta / 15)
+            else:
+                pending.append((a, m, fa, fl, fm, 0.5 * eps, depth + 1))
+                pending.append((m, b, fm, fr, fb, 0.5 * eps, depth + 1))
+
+        return math.fsum(accepted), nevals, list(pending)
+
+    def refine(self, a, b, fa, fb, midsum):
+        """
+        Refine integral estimates by repeatedly halving the interval width
+        until successive estimates agree to within `eps`.
+
+        Only the function values at the midpoints of the current intervals
+        are needed at each level: the trapezium and left rectangle estimates
+        with 2N intervals are the average of the N interval estimate and the
+        centre rectangle (midpoint) estimate with N intervals. The Romberg
+        estimates are built from the sequence of trapezium estimates.
+
+        Parameters
+        ----------
+        a: array
+            The lower bounds of the integrals.
+        b: array
+            The upper bounds of the integrals.
+        fa: array
+            The function values at the lower bounds.
+        fb: array
+            The function values at the upper bounds.
+        midsum: callable
+            A function, midsum(a, b, N), returning the centre rectangle
+            estimate with N intervals for each of the given integrals (i.e.,
+            `crect` or `vcrect`).
+
+        Return
+        ------
+        array:
+            The results of the integrals.
+        """
+
+        h = b - a
+
+        # estimates with a single interval
+        trap = 0.5 * h * (fa + fb)
+        left = h * fa
+        result = {
+            1: trap,
+            2: left,
+            3: np.full(len(a), np.nan),  # no centre estimate until first pass
+            4: trap,
+        }[self.method].copy()
+
+        # previous row of the Romberg table for each integral
+        nlevels = int(math.log2(self.MAXN)) + 1
+        table = np.zeros((len(a), nlevels))
+        table[:, 0] = trap
+
+        active = np.arange(len(a))  # indices of unconverged integrals
+        N = 1
+        level = 0
+        while N < self.MAXN:
+            centre = midsum(a[active], b[active], N)
+
+            trap[active] = 0.5 * (trap[active] + centre)
+            left[active] = 0.5 * (left[active] + centre)
+            N *= 2
+            level += 1
+
+            if self.method == 1:
+                estimate = trap[active]
+            elif self.method == 2:
+                estimate = left[active]
+            elif self.method == 3:
+                estimate = centre
+            else:
+                row = np.empty((len(active), level + 1))
+                row[:, 0] = trap[active]
+                for j in range(1, level + 1):
+                    row[:, j] = row[:, j - 1] + (
+                        row[:, j - 1] - table[active, j - 1]
+                    ) / (4**j - 1)
+                table[active, :level + 1] = row
+                estimate = row[:, level]
+
+            previous = result[active]
+            result[active] = estimate
+
+            # keep integrals that have not converged (including NaNs)
+            active = active[~(np.abs(estimate - previous) < self.eps)]
+            if len(active) == 0:
+                return result
+
+        raise ValueError("Maximum number of intervals reached")
+
     @staticmethod
     def lrect(a, b, N, f):
-        return float('nan')
+        """
+        Left rectangle method of numerical integration.
+
+        Parameters
+        ----------
+        a: (int, float)
+            The lower bound of integral
+        b: (int, float)
+            The upper bound of integral
+        N: int
+            The number of intervals to use.
+        f: callable
+            The function to be integrated.
+        """
+
+        h = (b - a) / N
+        return h * math.fsum(f(a + i * h) for i in range(N))
 
     @staticmethod
     def crect(a, b, N, f):
-        return float('nan')
+        """
+        Centre rectangle method of numerical integration.
+
+        Parameters
+        ----------
+        a: (int, float)
+            The lower bound of integral
+        b: (int, float)
+            The upper bound of integral
+        N: int
+            The number of intervals to use.
+        f: callable
+            The function to be integrated.
+        """
+
+        h = (b - a) / N
+        return h * math.fsum(f(a + (i + 0.5) * h) for i in range(N))
+
+    @staticmethod
+    def romberg(a, b, N, f):
+        """
+        Romberg method of numerical integration, i.e., Richardson
+        extrapolation of trapezium rule estimates with 1, 2, 4, ..., N
+        intervals.
+
+        Parameters
+        ----------
+        a: (int, float)
+            The lower bound of integral
+        b: (int, float)
+            The upper bound of integral
+        N: int
+            The number of intervals to use, which must be a power of two.
+        f: callable
+            The function to be integrated.
+        """
+
+        levels = int(round(math.log2(N)))
+        if 2**levels != N:
+            raise ValueError("N must be a power of two for the Romberg method")
+
+        h = b - a
+        row = [0.5 * h * (f(a) + f(b))]
+        for level in range(1, levels + 1):
+            # width of the intervals at the previous level
+            hprev = h / 2**(level - 1)
+            centre = hprev * math.fsum(
+                f(a + (i + 0.5) * hprev) for i in range(2**(level - 1))
+            )
+
+            new = [0.5 * (row[0] + centre)]
+            for j in range(1, level + 1):
+                new.append(new[j - 1] + (new[j - 1] - row[j - 1]) / (4**j - 1))
+            row = new
+
+        return row[-1]
 
     @staticmethod
     def trapz(a, b, N, f):
@@ -101,4 +483,53 @@ class Integration:
         f: callable
             The function to be integrated.
         """
-        return float('nan')
+
+        h = (b - a) / N
+        inner = math.fsum(f(a + i * h) for i in range(1, N))
+        return h * (0.5 * (f(a) + f(b)) + inner)
+
+    @classmethod
+    def arraySum(cls, a, h, start, stop, offset, f):
+        """
+        Sum f(a + (i + offset) h) over i = start, ..., stop - 1 for arrays of
+        lower bounds and interval widths. The sample points are passed to the
+        function in chunks of at most `CHUNKSIZE` values, so the memory used
+        stays bounded however large N is.
+
+        Parameters
+        ----------
+        a: array
+            The lower bounds of the integrals.
+        h: array
+            The interval widths for each integral.
+        start: int
+            The first interval index.
+        stop: int
+            One past the last interval index.
+        offset: float
+            The offset of the sample point within each interval, in units of h.
+        f: callable
+            The vectorised function to be integrated.
+
+        Return
+        ------
+        array:
+            The sum for each integral.
+        """
+
+        total = np.zeros(len(a))
+        step = max(1, cls.CHUNKSIZE // max(1, len(a)))
+        for first in range(start, stop, step):
+            i = np.arange(first, min(first + step, stop)) + offset
+            total += f(a[:, None] + i[None, :] * h[:, None]).sum(axis=1)
+
+        return total
+
+    @classmethod
+    def vcrect(cls, a, b, N, f):
+        """
+        Vectorised centre rectangle method for arrays of bounds `a` and `b`.
+        """
+
+        h = (b - a) / N
+        return h * cls.arraySum(a, h, 0, N, 0.5, f)
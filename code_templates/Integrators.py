@@ -0,0 +1,289 @@
+"""
+Integrators for updating the positions and velocities of a `ParticleSystem`
+by one time step. Each integrator is a function, integrator(system, deltaT),
+registered by name in `INTEGRATORS` along with the number of force
+(acceleration) evaluations it needs per step and its order of accuracy.
+"""
+
+import math
+
+
+INTEGRATORS = {}
+
+
+def register(name, nforces, order):
+    """
+    A decorator to add an integrator to the `INTEGRATORS` registry.
+
+    Parameters
+    ----------
+    name: str
+        The name used to select the integrator.
+    nforces: int
+        The number of force evaluations the integrator needs per step.
+    order: int
+        The order of the global error in the time step.
+    """
+
+    def decorator(integrator):
+        integrator.nforces = nforces
+        integrator.order = order
+        INTEGRATORS[name] = integrator
+        return integrator
+
+    return decorator
+
+
+def getIntegrator(name):
+    """
+    Return the integrator with the given name.
+    """
+
+    try:
+        return INTEGRATORS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unrecognised integrator '{name}'. Integrator must be one of: "
+            + ", ".join(INTEGRATORS)
+        )
+
+
+@register("euler", nforces=1, order=1)
+def euler(system, deltaT):
+    """
+    The Euler method: positions and velocities are both updated using the
+    values at the start of the step.
+    """
+
+    accelerations = system.currentAccelerations()
+    system.positions += system.velocities * deltaT
+    system.velocities += accelerations * deltaT
+
+
+@register("euler-cromer", nforces=1, order=1)
+def eulercromer(system, deltaT):
+    """
+    The Euler-Cromer (semi-implicit Euler) method: the positions are updated
+    using the velocities at the end of the step.
+    """
+
+    system.velocities += system.currentAccelerations() * deltaT
+    system.positions += system.velocities * deltaT
+
+
+@register("verlet", nforces=1, order=2)
+def verlet(system, deltaT):
+    """
+    The velocity Verlet method. The accelerations at the end of the step are
+    reused at the start of the next, so only one force evaluation is needed
+    per step.
+    """
+
+    accelerations = system.currentAccelerations()
+    system.positions += (
+        system.velocities * deltaT + 0.5 * accelerations * deltaT**2
+    )
+    system.velocities += 0.5 * accelerations * deltaT
+
+    system.updateGravitationalAcceleration()
+    system.velocities += 0.5 * system.accelerations * deltaT
+
+
+@register("leapfrog", nforces=1, order=2)
+def leapfrog(system, deltaT):
+    """
+    The drift-kick-drift leapfrog method, with the accelerations evaluated
+    at the middle of the step.
+    """
+
+    system.positions += 0.5 * system.velocities * deltaT
+    system.velocities += system.accelerationsAt(system.positions) * deltaT
+    system.positions += 0.5 * system.velocities * deltaT
+
+
+@register("rk4", nforces=4, order=4)
+def rk4(system, deltaT):
+    """
+    The classical fourth-order Runge-Kutta method.
+    """
+
+    r = system.positions
+    v = system.velocities
+
+    k1r = v
+    k1v = system.currentAccelerations().copy()
+    k2r = v + 0.5 * deltaT * k1v
+    k2v = system.accelerationsAt(r + 0.5 * deltaT * k1r)
+    k3r = v + 0.5 * deltaT * k2v
+    k3v = system.accelerationsAt(r + 0.5 * deltaT * k2r)
+    k4r = v + deltaT * k3v
+    k4v = system.accelerationsAt(r + deltaT * k3r)
+
+    system.positions += deltaT / 6 * (k1r + 2 * k2r + 2 * k3r + k4r)
+    system.velocities += deltaT / 6 * (k1v + 2 * k2v + 2 * k3v + k4v)
+
+
+# Yoshida fourth-order coefficients
+_w1 = 1 / (2 - 2**(1 / 3))
+_w0 = -2**(1 / 3) * _w1
+YOSHIDA_DRIFTS = (_w1 / 2, (_w0 + _w1) / 2, (_w0 + _w1) / 2, _w1 / 2)
+YOSHIDA_KICKS = (_w1, _w0, _w1)
+
+
+@register("yoshida4", nforces=3, order=4)
+def yoshida4(system, deltaT):
+    """
+    Yoshida's fourth-order symplectic method, made from three leapfrog-like
+    kicks (one of them backwards in time) separated by drifts.
+    """
+
+    for drift, kick in zip(YOSHIDA_DRIFTS, YOSHIDA_KICKS):
+        system.positions += drift * system.velocities * deltaT
+        system.velocities += (
+            kick * system.accelerationsAt(system.positions) * deltaT
+        )
+    system.positions += YOSHIDA_DRIFTS[-1] * system.velocities * deltaT
+
+
+def energyDrift(system, deltaT, duration):
+    """
+    Run a copy of a system for the given duration and return the maximum
+    fractional change in its total energy.
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The system to test (it is not changed).
+    deltaT: float
+        The time step (s).
+    duration: float
+        The length of time to simulate (s).
+    """
+
+    system = system.copy()
+    energy0 = system.totalEnergy()
+
+    drift = 0.0
+    for _ in range(int(math.ceil(duration / deltaT))):
+        system.update(deltaT)
+        drift = max(drift, abs(system.totalEnergy() / energy0 - 1))
+
+    return drift
+
+
+def cheapestIntegrator(system, duration, budget, deltaT, names=None,
+                       maxhalvings=10):
+    """
+    Find the integrator needing the fewest force evaluations to simulate a
+    system for a given duration while keeping the fractional energy drift
+    within a budget. For each integrator the time step is halved, starting
+    from `deltaT`, until the budget is met.
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The system to test (it is not changed).
+    duration: float
+        The length of time to simulate (s).
+    budget: float
+        The maximum allowed fractional change in the total energy.
+    deltaT: float
+        The largest time step to try (s).
+    names: list
+        The names of the integrators to try. Defaults to all of them.
+    maxhalvings: int
+        The maximum number of times to halve the time step.
+
+    Returns
+    -------
+    tuple
+        The name of the cheapest integrator, the time step it needs and the
+        number of force evaluations for the whole duration.
+    """
+
+    best = None
+    for name in (INTEGRATORS if names is None else names):
+        trial = system.copy()
+        trial.setIntegrator(name)
+
+        step = deltaT
+        for _ in range(maxhalvings + 1):
+            if energyDrift(trial, step, duration) <= budget:
+                cost = INTEGRATORS[name].nforces * math.ceil(duration / step)
+                if best is None or cost < best[2]:
+                    best = (name, step, cost)
+                break
+            step /= 2
+
+    if best is None:
+        raise ValueError("No integrator meets the energy drift budget")
+
+    return best
+
+
+# Dormand-Prince 5(4) coefficients
+DOPRI_A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+DOPRI_B5 = DOPRI_A[-1] + (0,)
+DOPRI_B4 = (
+    5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100,
+    1 / 40
+)
+
+
+def dopriStep(system, deltaT):
+    """
+    Take a trial Dormand-Prince 5(4) step without changing the system.
+
+    Returns
+    -------
+    tuple
+        The fifth-order positions and velocities at the end of the step, the
+        accelerations at those positions, and the difference between the
+        fifth- and embedded fourth-order positions and velocities (an
+        estimate of the error in the step).
+    """
+
+    r = system.positions
+    v = system.velocities
+
+    kr = [v]
+    kv = [system.currentAccelerations().copy()]
+    for row in DOPRI_A[1:]:
+        dr = sum(a * k for a, k in zip(row, kr) if a != 0)
+        dv = sum(a * k for a, k in zip(row, kv) if a != 0)
+        kr.append(v + deltaT * dv)
+        kv.append(system.accelerationsAt(r + deltaT * dr))
+
+    # the last stage is evaluated at the fifth-order solution
+    positions = r + deltaT * dr
+    velocities = v + deltaT * dv
+
+    rerror = deltaT * sum((b5 - b4) * k for b5, b4, k in
+                          zip(DOPRI_B5, DOPRI_B4, kr))
+    verror = deltaT * sum((b5 - b4) * k for b5, b4, k in
+                          zip(DOPRI_B5, DOPRI_B4, kv))
+
+    return positions, velocities, kv[-1], rerror, verror
+
+
+@register("dopri5", nforces=6, order=5)
+def dopri5(system, deltaT):
+    """
+    The Dormand-Prince fifth-order Runge-Kutta method. The accelerations at
+    the end of the step are reused at the start of the next. See
+    `AdaptiveStepping` for its use with an adaptive time step.
+    """
+
+    positions, velocities, accelerations, _, _ = dopriStep(system, deltaT)
+    system.positions[:] = positions
+    system.velocities[:] = velocities
+    system.accelerations[:] = accelerations
+    system.accelerationPositions = positions.copy()
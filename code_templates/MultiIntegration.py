@@ -0,0 +1,325 @@
+import math
+import time
+
+import numpy as np
+
+from Integration import Integration
+
+
+class MultiIntegration(Integration):
+    """
+    Class to setup an integration instance for a function of several
+    variables over a rectangular box, e.g., a 2D or 3D integral.
+
+    Parameters
+    ----------
+    function: callable
+        The function to be integrated. It is called as function(x, y, ...)
+        with one NumPy array of coordinates for each dimension and must
+        return an array of the same shape.
+    method: int
+        An integer defining the integration method to use: 1 to 4 use the
+        tensor product of the equivalent one-dimensional rule in `Integration`
+        (4 is Romberg integration, i.e., repeated Richardson extrapolation of
+        the trapezium rule), 5 is Monte Carlo, 6 is quasi-Monte Carlo with a
+        Sobol sequence and 7 is quasi-Monte Carlo with a Halton sequence.
+        Default is to use the trapezium rule.
+    eps: float
+        A value defining the absolute precision of the integration. For the
+        Monte Carlo methods this is the required standard error.
+    seed: int
+        A seed for the random number generator used by the Monte Carlo
+        methods.
+    """
+
+    # the number of independently scrambled sequences used to estimate the
+    # error in the quasi-Monte Carlo methods
+    NREPLICATES = 8
+
+    def __init__(self, function, method=1, eps=1e-5, seed=None):
+        super().__init__(function, method=method, eps=eps)
+        self.seed = seed
+
+    def setMethod(self, method):
+        if method in (1, 2, 3, 4):
+            super().setMethod(method)
+        elif method == 5:
+            self.integrationMethod = self.montecarlo
+        elif method == 6:
+            self.integrationMethod = self.sobol
+        elif method == 7:
+            self.integrationMethod = self.halton
+        else:
+            raise ValueError(
+                "Unrecognised integration method. Method must be 1 "
+                "(trapezoid), 2 (left rectangle), 3 (centre rectangle), 4 "
+                "(Romberg), 5 (Monte Carlo), 6 (Sobol) or 7 (Halton)."
+            )
+        self.method = method
+
+    def evaluate(self, lower, upper):
+        """
+        Evaluate the integral over the box with the given lower and upper
+        corners. The number of samples is doubled until two successive
+        estimates agree to within the absolute precision `eps` (or, for the
+        Monte Carlo methods, until the estimated standard error is below
+        `eps`). The number of function evaluations is stored in the `nevals`
+        attribute, the final error estimate in `error` and the time taken in
+        seconds in `walltime`.
+
+        Parameters
+        ----------
+        lower: (list, array)
+            The lower bound of the integral in each dimension.
+        upper: (list, array)
+            The upper bound of the integral in each dimension.
+
+        Return
+        ------
+        float:
+            The result of the integral.
+        """
+
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+
+        if lower.ndim != 1 or lower.shape != upper.shape:
+            raise ValueError("Lower and upper bounds must be 1D arrays of the "
+                             "same length")
+
+        if np.any(lower >= upper):
+            raise ValueError(
+                "A lower bound is greater than or equal to the upper bound"
+            )
+
+        start = time.perf_counter()
+        if self.method <= 4:
+            result = self.evaluateGrid(lower, upper)
+        else:
+            result = self.evaluateMonteCarlo(lower, upper)
+        self.walltime = time.perf_counter() - start
+
+        return result
+
+    def evaluateGrid(self, lower, upper):
+        """
+        Evaluate the integral with a tensor product rule, refining the grid
+        in every dimension until successive estimates agree to within `eps`.
+
+        The nodes of the trapezium and left rectangle rules with N intervals
+        are every other node of the rules with 2N intervals, so each doubling
+        only evaluates the function at the new points and adds them to the
+        previous weighted sum. The centre rectangle rule shares no points
+        between successive grids, so every grid is evaluated in full. The
+        Romberg estimates are built from the sequence of trapezium estimates,
+        as in `Integration.refine`.
+        """
+
+        ndim = len(lower)
+
+        N = 1
+        self.nevals = 0
+        index = np.arange(len(self.nodes(N)[0]))
+        total = self.gridSum(lower, upper, N, [index] * ndim)
+        result = total * np.prod((upper - lower) / N)
+
+        # previous row of the Romberg table
+        table = [result]
+
+        while N**ndim < self.MAXN:
+            N *= 2
+
+            index = np.arange(len(self.nodes(N)[0]))
+            if self.method == 3:
+                total = self.gridSum(lower, upper, N, [index] * ndim)
+            else:
+                # the new points are those with an odd node in dimension k
+                # and even (old) nodes in all the dimensions before it, for
+                # each k
+                for k in range(ndim):
+                    total += self.gridSum(
+                        lower, upper, N,
+                        [index[::2]] * k + [index[1::2]]
+                        + [index] * (ndim - k - 1),
+                    )
+            estimate = total * np.prod((upper - lower) / N)
+
+            if self.method == 4:
+                row = [estimate]
+                for j in range(1, len(table) + 1):
+                    row.append(
+                        row[j - 1] + (row[j - 1] - table[j - 1]) / (4**j - 1)
+                    )
+                table = row
+                estimate = row[-1]
+
+            previous = result
+            result = estimate
+
+            self.error = abs(result - previous)
+            if self.error < self.eps:
+                return result
+
+        raise ValueError("Maximum number of intervals reached")
+
+    def nodes(self, N):
+        """
+        The one-dimensional nodes (in units of the interval width) and
+        weights of the rule with N intervals.
+        """
+
+        if self.method == 2:
+            return np.arange(N, dtype=float), np.ones(N)
+        if self.method == 3:
+            return np.arange(N) + 0.5, np.ones(N)
+
+        weights = np.ones(N + 1)
+        weights[[0, -1]] = 0.5
+        return np.arange(N + 1, dtype=float), weights
+
+    def gridSum(self, lower, upper, N, index):
+        """
+        The weighted sum of the function values over the tensor product of
+        the given nodes of the one-dimensional rule with N intervals (not
+        multiplied by the volume of an interval). The points are passed to
+        the function in chunks of at most `CHUNKSIZE`, so the memory used
+        stays bounded.
+
+        Parameters
+        ----------
+        lower: array
+            The lower bound of the integral in each dimension.
+        upper: array
+            The upper bound of the integral in each dimension.
+        N: int
+            The number of intervals in each dimension.
+        index: list
+            An array of the indices of the nodes to use in each dimension.
+
+        Return
+        ------
+        float:
+            The weighted sum.
+        """
+
+        h = (upper - lower) / N
+        nodes, weights = self.nodes(N)
+        coords = [lo + nodes[i] * step for lo, i, step in zip(lower, index, h)]
+        nodeweights = [weights[i] for i in index]
+        shape = tuple(len(i) for i in index)
+        npoints = int(np.prod(shape))
+
+        total = 0.0
+        for first in range(0, npoints, self.CHUNKSIZE):
+            idx = np.unravel_index(
+                np.arange(first, min(first + self.CHUNKSIZE, npoints)), shape
+            )
+            w = np.prod([c[i] for c, i in zip(nodeweights, idx)], axis=0)
+            values = self.functionToBeIntegrated(
+                *[c[i] for c, i in zip(coords, idx)]
+            )
+            total += np.dot(w, values)
+
+        self.nevals += npoints
+
+        return total
+
+    def evaluateMonteCarlo(self, lower, upper):
+        """
+        Evaluate the integral by (quasi-)Monte Carlo sampling, doubling the
+        number of samples until the streaming estimate of the standard error
+        is below `eps`.
+
+        For plain Monte Carlo the error comes from the running variance of
+        the function values. For quasi-Monte Carlo `NREPLICATES` independently
+        scrambled sequences are used and the error comes from the scatter
+        between their estimates.
+        """
+
+        ndim = len(lower)
+        volume = np.prod(upper - lower)
+        rng = np.random.default_rng(self.seed)
+        f = self.functionToBeIntegrated
+
+        def sample(u):
+            # map points in the unit cube to the box and evaluate f in chunks
+            values = np.empty(len(u))
+            for first in range(0, len(u), self.CHUNKSIZE):
+                x = lower + u[first:first + self.CHUNKSIZE] * (upper - lower)
+                values[first:first + self.CHUNKSIZE] = f(*x.T)
+            return values
+
+        if self.method == 5:
+            samplers = [self.montecarlo(ndim, rng)]
+        else:
+            samplers = [
+                self.integrationMethod(ndim, rng)
+                for _ in range(self.NREPLICATES)
+            ]
+
+        # running number of samples, means and sums of squared deviations
+        # for each sequence, combined batch by batch
+        n = 0
+        means = np.zeros(len(samplers))
+        m2 = np.zeros(len(samplers))
+
+        batch = 256
+        while n < self.MAXN:
+            for i, sampler in enumerate(samplers):
+                values = sample(sampler(batch))
+                bmean = values.mean()
+                delta = bmean - means[i]
+                means[i] += delta * batch / (n + batch)
+                m2[i] += (
+                    np.sum((values - bmean)**2)
+                    + delta**2 * n * batch / (n + batch)
+                )
+            n += batch
+            self.nevals = n * len(samplers)
+
+            result = volume * np.mean(means)
+            if self.method == 5:
+                self.error = volume * math.sqrt(m2[0] / (n - 1) / n)
+            else:
+                self.error = volume * np.std(means, ddof=1) / math.sqrt(
+                    len(samplers)
+                )
+
+            if self.error < self.eps:
+                return result
+
+            # double the total number of samples
+            batch = n
+
+        raise ValueError("Maximum number of samples reached")
+
+    @staticmethod
+    def montecarlo(ndim, rng):
+        """
+        Return a function drawing n uniform pseudo-random points in the unit
+        cube.
+        """
+
+        return lambda n: rng.random((n, ndim))
+
+    @staticmethod
+    def sobol(ndim, rng):
+        """
+        Return a function drawing the next n points of a scrambled Sobol
+        sequence in the unit cube.
+        """
+
+        from scipy.stats import qmc
+
+        return qmc.Sobol(ndim, scramble=True, seed=rng).random
+
+    @staticmethod
+    def halton(ndim, rng):
+        """
+        Return a function drawing the next n points of a scrambled Halton
+        sequence in the unit cube.
+        """
+
+        from scipy.stats import qmc
+
+        return qmc.Halton(ndim, scramble=True, seed=rng).random
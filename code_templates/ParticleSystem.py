@@ -0,0 +1,479 @@
+"""
+A system of particles interacting through gravity, stored as arrays so that
+the whole system can be updated with a few NumPy operations per time step.
+"""
+
+import copy
+
+import numpy as np
+
+from BarnesHut import Octree
+from Integrators import getIntegrator
+
+
+class ParticleSystem:
+    """
+    A set of particles moving under their mutual gravitational attraction.
+    The positions, velocities and accelerations are stored as contiguous
+    (N, 3) arrays of floats and the masses as a length N array, so the
+    pairwise forces can be calculated without a Python loop over particles.
+
+    Parameters
+    ----------
+    positions: array
+        An (N, 3) array of the particle positions (m).
+    velocities: array
+        An (N, 3) array of the particle velocities (m/s).
+    masses: array
+        A length N array of the particle masses (kg).
+    names: list
+        A list of names for the particles. Defaults to "Particle 0",
+        "Particle 1", etc.
+    accelerations: array
+        An (N, 3) array of initial accelerations (m/s^2). Defaults to zero.
+    externalAcceleration: array
+        A uniform acceleration added to every particle, e.g., [0, -9.81, 0]
+        for a uniform gravitational field. Defaults to zero.
+    softening: float
+        A softening length (m) added in quadrature to the particle
+        separations to avoid infinite forces in close encounters. Defaults
+        to zero.
+    integrator: str
+        The name of the integrator used to update the system (see
+        `Integrators.INTEGRATORS`). Defaults to "euler".
+    forceSolver: str
+        The method used to calculate the gravitational accelerations: "direct"
+        summation over all pairs, or an approximate "barneshut" octree.
+        Defaults to "direct".
+    theta: float
+        The opening angle used by the Barnes-Hut solver. Defaults to 0.5.
+    """
+
+    G = 6.6743e-11  # gravitational constant (m^3 kg^-1 s^-2)
+
+    # maximum number of particle pairs handled at once when calculating the
+    # accelerations, to keep the memory used bounded for large N
+    CHUNKSIZE = 2**20
+
+    def __init__(self, positions, velocities, masses, names=None,
+                 accelerations=None, externalAcceleration=None,
+                 softening=0.0, integrator="euler", forceSolver="direct",
+                 theta=0.5):
+        self.positions = np.array(positions, dtype=np.float64, ndmin=2)
+        self.velocities = np.array(velocities, dtype=np.float64, ndmin=2)
+        self.masses = np.array(masses, dtype=np.float64, ndmin=1)
+
+        N = len(self.masses)
+        if self.positions.shape != (N, 3) or self.velocities.shape != (N, 3):
+            raise ValueError("Positions and velocities must be (N, 3) arrays "
+                             "for N particles")
+
+        if accelerations is None:
+            self.accelerations = np.zeros((N, 3))
+        else:
+            self.accelerations = np.array(accelerations, dtype=np.float64,
+                                          ndmin=2)
+            if self.accelerations.shape != (N, 3):
+                raise ValueError("Accelerations must be an (N, 3) array for N "
+                                 "particles")
+
+        if names is None:
+            names = [f"Particle {i}" for i in range(N)]
+        if len(names) != N:
+            raise ValueError("There must be one name for each particle")
+        self.names = list(names)
+
+        if externalAcceleration is None:
+            externalAcceleration = np.zeros(3)
+        self.externalAcceleration = np.array(externalAcceleration,
+                                             dtype=np.float64)
+
+        self.softening = softening
+        self.setIntegrator(integrator)
+        self.setForceSolver(forceSolver, theta=theta)
+
+        self.time = 0.0  # simulation time (s)
+        self.forceEvaluations = 0
+
+        # positions at which the stored accelerations were calculated
+        self.accelerationPositions = None
+
+        # if True, the force solver also calculates the potential energy from
+        # the same pairwise separations and stores it (and the positions it
+        # was calculated at) in `potential` and `potentialPositions`
+        self.computePotential = False
+        self.potential = None
+        self.potentialPositions = None
+
+    def setIntegrator(self, integrator):
+        self.integrator = getIntegrator(integrator)
+        self.integratorName = integrator
+
+    def setForceSolver(self, forceSolver, theta=0.5, executor=None):
+        """
+        Set the method used to calculate the gravitational accelerations.
+
+        Parameters
+        ----------
+        forceSolver: str
+            Either "direct" or "barneshut".
+        theta: float
+            The opening angle used by the Barnes-Hut solver.
+        executor: concurrent.futures.Executor
+            An executor, e.g., a ProcessPoolExecutor, used to share the
+            Barnes-Hut tree walks between several cores.
+        """
+
+        if forceSolver not in ("direct", "barneshut"):
+            raise ValueError(
+                "Unrecognised force solver. Solver must be 'direct' or "
+                "'barneshut'."
+            )
+        if theta < 0:
+            raise ValueError("The opening angle must not be negative")
+        self.forceSolver = forceSolver
+        self.theta = theta
+        self.executor = executor
+
+    def copy(self):
+        """
+        Return an independent copy of the system (sharing any executor).
+        """
+
+        executor, self.executor = self.executor, None
+        try:
+            new = copy.deepcopy(self)
+        finally:
+            self.executor = executor
+        new.executor = executor
+
+        return new
+
+    @classmethod
+    def fromParticles(cls, particles, **kwargs):
+        """
+        Create a system from a list of objects with `position`, `velocity`,
+        `acceleration`, `mass` and `name` attributes, e.g., `Particle`
+        objects.
+
+        Parameters
+        ----------
+        particles: list
+            The particles to include in the system.
+
+        Returns
+        -------
+        ParticleSystem
+            A new system containing copies of the particles' states.
+        """
+
+        return cls(
+            [p.position for p in particles],
+            [p.velocity for p in particles],
+            [p.mass for p in particles],
+            names=[p.name for p in particles],
+            accelerations=[p.acceleration for p in particles],
+            **kwargs
+        )
+
+    def __len__(self):
+        return len(self.masses)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("Particle index out of range")
+        return Particle.fromSystem(self, index % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        return f"ParticleSystem: {len(self)} particles"
+
+    def accelerationsAt(self, positions):
+        """
+        Calculate the acceleration of every particle due to the gravitational
+        attraction of all the others (plus any external acceleration) if
+        they were at the given positions, using the system's force solver.
+
+        Parameters
+        ----------
+        positions: array
+            An (N, 3) array of particle positions (m).
+
+        Returns
+        -------
+        array
+            An (N, 3) array of accelerations (m/s^2).
+        """
+
+        self.forceEvaluations += 1
+
+        if self.forceSolver == "barneshut":
+            result = Octree(positions, self.masses).accelerations(
+                theta=self.theta, G=self.G, softening=self.softening,
+                executor=self.executor, potential=self.computePotential
+            )
+        else:
+            result = self.directAccelerations(
+                positions, potential=self.computePotential
+            )
+
+        if self.computePotential:
+            accelerations, energy = result
+            self.potential = energy - np.sum(
+                self.masses * (positions @ self.externalAcceleration)
+            )
+            self.potentialPositions = np.array(positions)
+        else:
+            accelerations = result
+
+        accelerations += self.externalAcceleration
+
+        return accelerations
+
+    def directAccelerations(self, positions, potential=False):
+        """
+        Calculate the gravitational accelerations by direct summation over
+        all pairs of particles. The pairwise separations are calculated for
+        blocks of particles at a time, so at most `CHUNKSIZE` pairs are held
+        in memory.
+
+        If `potential` is True, the gravitational potential energy is
+        calculated from the same separations and (accelerations, energy) is
+        returned.
+        """
+
+        N = len(self)
+        accelerations = np.empty((N, 3))
+        energy = 0.0
+        rows = max(1, self.CHUNKSIZE // N)
+        for first in range(0, N, rows):
+            last = min(first + rows, N)
+
+            # separation vectors from each particle in the block to every
+            # particle, with shape (rows, N, 3)
+            separation = positions[None, :, :] - positions[first:last, None, :]
+            distance2 = np.einsum("ijk,ijk->ij", separation, separation)
+            distance2 += self.softening**2
+
+            # exclude the force of each particle on itself
+            idx = np.arange(first, last)
+            distance2[idx - first, idx] = np.inf
+
+            accelerations[first:last] = self.G * np.einsum(
+                "ij,ijk->ik", self.masses / distance2**1.5, separation
+            )
+
+            if potential:
+                # every pair appears twice over all the blocks
+                energy -= 0.5 * self.G * np.dot(
+                    self.masses[first:last],
+                    (1.0 / np.sqrt(distance2)) @ self.masses,
+                )
+
+        if potential:
+            return accelerations, energy
+
+        return accelerations
+
+    def updateGravitationalAcceleration(self):
+        """
+        Update the stored accelerations for the current positions.
+        """
+
+        self.accelerations[:] = self.accelerationsAt(self.positions)
+        self.accelerationPositions = self.positions.copy()
+
+    def currentAccelerations(self):
+        """
+        Return the accelerations at the current positions, only calculating
+        them if the positions have changed since they were last calculated.
+        """
+
+        if (
+            self.accelerationPositions is None
+            or not np.array_equal(self.accelerationPositions, self.positions)
+        ):
+            self.updateGravitationalAcceleration()
+
+        return self.accelerations
+
+    def kineticEnergy(self):
+        """
+        Return the total kinetic energy of the system (J).
+        """
+
+        return 0.5 * np.sum(self.masses * np.sum(self.velocities**2, axis=1))
+
+    def potentialEnergy(self):
+        """
+        Return the total gravitational potential energy of the system (J),
+        including the potential of any external acceleration.
+        """
+
+        N = len(self)
+        energy = -np.sum(
+            self.masses * (self.positions @ self.externalAcceleration)
+        )
+        rows = max(1, self.CHUNKSIZE // N)
+        for first in range(0, N, rows):
+            last = min(first + rows, N)
+
+            # only count each pair once (j > i)
+            separation = (
+                self.positions[None, :, :] - self.positions[first:last, None, :]
+            )
+            distance = np.sqrt(
+                np.einsum("ijk,ijk->ij", separation, separation)
+                + self.softening**2
+            )
+            pairs = np.arange(N)[None, :] > np.arange(first, last)[:, None]
+            energy -= self.G * np.sum(
+                (self.masses[first:last, None] * self.masses[None, :])[pairs]
+                / distance[pairs]
+            )
+
+        return energy
+
+    def totalEnergy(self):
+        """
+        Return the total energy of the system (J).
+        """
+
+        return self.kineticEnergy() + self.potentialEnergy()
+
+    def linearMomentum(self):
+        """
+        Return the total linear momentum of the system (kg m/s).
+        """
+
+        return self.masses @ self.velocities
+
+    def angularMomentum(self):
+        """
+        Return the total angular momentum of the system about the origin
+        (kg m^2/s).
+        """
+
+        return self.masses @ np.cross(self.positions, self.velocities)
+
+    def update(self, deltaT):
+        """
+        Update the positions and velocities of all the particles by one time
+        step using the system's integrator.
+
+        Parameters
+        ----------
+        deltaT: float
+            The time step (s).
+        """
+
+        self.integrator(self, deltaT)
+        self.time += deltaT
+
+
+class Particle:
+    """
+    A single particle. Its position, velocity, acceleration, mass and name are
+    a view of one row of the arrays in a `ParticleSystem`, so changing them
+    changes the system and vice versa. A `Particle` created directly belongs
+    to its own one-particle system.
+
+    Parameters
+    ----------
+    position: array
+        The position of the particle (m).
+    velocity: array
+        The velocity of the particle (m/s).
+    acceleration: array
+        The acceleration of the particle (m/s^2).
+    name: str
+        The name of the particle.
+    mass: float
+        The mass of the particle (kg).
+    """
+
+    def __init__(self, position=np.array([0, 0, 0], dtype=float),
+                 velocity=np.array([0, 0, 0], dtype=float),
+                 acceleration=np.array([0, -10, 0], dtype=float),
+                 name='Ball', mass=1.0):
+        self.system = ParticleSystem([position], [velocity], [mass],
+                                     names=[name],
+                                     accelerations=[acceleration])
+        self.index = 0
+
+    @classmethod
+    def fromSystem(cls, system, index):
+        """
+        Return a view of particle `index` in a `ParticleSystem`.
+        """
+
+        particle = cls.__new__(cls)
+        particle.system = system
+        particle.index = index
+        return particle
+
+    def __str__(self):
+        return (
+            "Particle: {0}, Mass: {1:.3e}, Position: {2}, Velocity: {3}, "
+            "Acceleration: {4}".format(
+                self.name, self.mass, self.position, self.velocity,
+                self.acceleration
+            )
+        )
+
+    @property
+    def position(self):
+        return self.system.positions[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.system.positions[self.index] = value
+
+    @property
+    def velocity(self):
+        return self.system.velocities[self.index]
+
+    @velocity.setter
+    def velocity(self, value):
+        self.system.velocities[self.index] = value
+
+    @property
+    def acceleration(self):
+        return self.system.accelerations[self.index]
+
+    @acceleration.setter
+    def acceleration(self, value):
+        self.system.accelerations[self.index] = value
+
+    @property
+    def mass(self):
+        return self.system.masses[self.index]
+
+    @mass.setter
+    def mass(self, value):
+        self.system.masses[self.index] = value
+
+    @property
+    def name(self):
+        return self.system.names[self.index]
+
+    @name.setter
+    def name(self, value):
+        self.system.names[self.index] = value
+
+    def update(self, deltaT):
+        """
+        Update the position and velocity of this particle alone, using its
+        current acceleration and the Euler method.
+
+        Parameters
+        ----------
+        deltaT: float
+            The time step (s).
+        """
+
+        self.position += self.velocity * deltaT
+        self.velocity += self.acceleration * deltaT
@@ -0,0 +1,403 @@
+"""
+Run the same particle simulation for a grid of configurations (e.g., time
+steps and integrators) in parallel, to check that the results have converged.
+For example:
+
+>>> results = sweep(system, duration=3.15e7,
+...                 integrator=["euler", "verlet", "rk4"],
+...                 deltaT=[3600, 1800, 900])
+>>> print(formatTable(results))
+
+or from the command line, with the initial conditions in a checkpoint file
+written by `Checkpoint.saveCheckpoint`:
+
+    python Sweep.py solar.npz --duration 3.15e7 --integrator euler verlet rk4
+        --deltaT 3600 1800 900 --cache sweepcache
+
+The initial positions, velocities and masses are put in shared memory, so
+each worker process reads them without a copy being sent for every run. The
+results of each run are saved in a cache directory, if given, and runs that
+are already there are not repeated.
+"""
+
+import argparse
+import copy
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Checkpoint import loadCheckpoint
+from Conservation import ConservationMonitor
+from Trajectory import writeAtomic
+
+
+# system arrays shared between the worker processes
+SHARED = ("positions", "velocities", "masses", "accelerations")
+
+# the parameters that can be varied, with the types used to parse them on the
+# command line
+PARAMETERS = {
+    "integrator": str,
+    "deltaT": float,
+    "forceSolver": str,
+    "theta": float,
+    "softening": float,
+}
+
+# columns of the summary table
+COLUMNS = (
+    "integrator", "deltaT", "forceSolver", "theta", "softening", "steps",
+    "forceEvaluations", "maxEnergyDrift", "momentumDrift",
+    "angularMomentumDrift", "positionDifference", "walltime", "cached",
+)
+
+# changed whenever the stored metrics change meaning, so old cached runs are
+# not reused
+CACHEVERSION = 2
+
+# the template system and shared memory block in each worker process
+_worker = {}
+
+
+def configurations(**grid):
+    """
+    Return a list of the configurations in a grid of parameter values, each a
+    dictionary of parameter names and values.
+
+    Parameters
+    ----------
+    grid:
+        Lists of values for any of the names in `PARAMETERS`.
+    """
+
+    for name in grid:
+        if name not in PARAMETERS:
+            raise ValueError(f"Unrecognised parameter '{name}'. Parameters "
+                             f"must be one of {', '.join(PARAMETERS)}.")
+
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def cacheKey(system, config, duration, every):
+    """
+    Return a hash identifying a run: the initial state of the system, the
+    configuration, duration and conservation sampling interval.
+    """
+
+    sha = hashlib.sha256()
+    for name in SHARED:
+        sha.update(np.ascontiguousarray(getattr(system, name)).tobytes())
+    sha.update(json.dumps(
+        {
+            "version": CACHEVERSION,
+            "config": config,
+            "duration": duration,
+            "every": every,
+            "time": system.time,
+            "integrator": system.integratorName,
+            "forceSolver": system.forceSolver,
+            "theta": system.theta,
+            "softening": system.softening,
+            "externalAcceleration": system.externalAcceleration.tolist(),
+            "G": system.G,
+        },
+        sort_keys=True,
+    ).encode("utf-8"))
+
+    return sha.hexdigest()
+
+
+def _attach(name, shapes, template):
+    # worker initializer: attach the shared memory and keep the template
+    # system, whose arrays are views of it
+    block = shared_memory.SharedMemory(name=name)
+    offset = 0
+    for field, shape in zip(SHARED, shapes):
+        array = np.ndarray(shape, dtype=np.float64, buffer=block.buf,
+                           offset=offset)
+        setattr(template, field, array)
+        offset += array.nbytes
+
+    _worker["block"] = block
+    _worker["template"] = template
+
+
+def _run(config, duration, every):
+    # worker task: run one configuration from the shared initial conditions
+    system = copy.copy(_worker["template"])
+    for field in SHARED:
+        setattr(system, field, getattr(system, field).copy())
+
+    return runConfiguration(system, config, duration, every)
+
+
+def runConfiguration(system, config, duration, every=10):
+    """
+    Simulate a system (which is changed) with one configuration.
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The initial state of the system.
+    config: dict
+        The parameter values to use. Any not given are taken from the
+        system, except "deltaT", which is required.
+    duration: float
+        The length of time to simulate (s).
+    every: int
+        Sample the conserved quantities every `every` steps.
+
+    Returns
+    -------
+    tuple
+        A dictionary of summary metrics and the final positions.
+    """
+
+    start = time.perf_counter()
+
+    if "integrator" in config:
+        system.setIntegrator(config["integrator"])
+    if "forceSolver" in config or "theta" in config:
+        system.setForceSolver(config.get("forceSolver", system.forceSolver),
+                              theta=config.get("theta", system.theta))
+    if "softening" in config:
+        system.softening = config["softening"]
+
+    # shorten the time step slightly if needed so that every run ends at
+    # the same time
+    steps = int(np.ceil(duration / config["deltaT"]))
+    deltaT = duration / steps
+
+    monitor = ConservationMonitor(system, every=every)
+    maxdrift = 0.0
+    evaluations = system.forceEvaluations
+    for _ in range(steps):
+        system.update(deltaT)
+
+        # only count the integrator's force evaluations, not any made by the
+        # monitor
+        before = system.forceEvaluations
+        monitor(system)
+        evaluations += system.forceEvaluations - before
+
+        maxdrift = max(maxdrift, abs(monitor.energyDrift))
+
+    metrics = {
+        "integrator": system.integratorName,
+        "deltaT": config["deltaT"],
+        "forceSolver": system.forceSolver,
+        "theta": system.theta,
+        "softening": system.softening,
+        "steps": steps,
+        "forceEvaluations": system.forceEvaluations - evaluations,
+        "maxEnergyDrift": maxdrift,
+        "momentumDrift": monitor.momentumDrift,
+        "angularMomentumDrift": monitor.angularMomentumDrift,
+        "walltime": time.perf_counter() - start,
+    }
+
+    return metrics, system.positions
+
+
+def sweep(system, duration, configs=None, every=10, processes=None,
+          cachedir=None, **grid):
+    """
+    Simulate a system with each of a set of configurations over a process
+    pool and collect a summary of each run. The final positions of each run
+    are compared with those of the run with the smallest time step and
+    otherwise the same configuration, in the "positionDifference" column (the
+    largest distance between a particle's positions divided by the root mean
+    square distance of the particles from their centre of mass).
+
+    Parameters
+    ----------
+    system: ParticleSystem
+        The initial state of the system (it is not changed).
+    duration: float
+        The length of time to simulate (s).
+    configs: list
+        A list of configuration dictionaries. If not given, they are made
+        from the grid of parameter values in the keyword arguments, e.g.,
+        `integrator=["euler", "verlet"], deltaT=[10, 5]`.
+    every: int
+        Sample the conserved quantities every `every` steps.
+    processes: int
+        The number of worker processes. Defaults to the number of cores.
+    cachedir: str
+        A directory in which the result of each run is saved. Runs whose
+        results are already there are not repeated.
+
+    Returns
+    -------
+    list
+        A dictionary of summary metrics for each configuration, in order.
+    """
+
+    if configs is None:
+        configs = configurations(**grid)
+    if not configs:
+        raise ValueError("There are no configurations to run")
+    for config in configs:
+        if "deltaT" not in config:
+            raise ValueError("Every configuration must have a time step")
+
+    results = [None] * len(configs)
+    positions = [None] * len(configs)
+
+    fnames = [None] * len(configs)
+    if cachedir is not None:
+        os.makedirs(cachedir, exist_ok=True)
+        for i, config in enumerate(configs):
+            fnames[i] = os.path.join(
+                cachedir, cacheKey(system, config, duration, every) + ".npz"
+            )
+            if os.path.exists(fnames[i]):
+                with np.load(fnames[i]) as data:
+                    results[i] = json.loads(data["metrics"].tobytes())
+                    positions[i] = data["positions"]
+                results[i]["cached"] = True
+
+    todo = [i for i in range(len(configs)) if results[i] is None]
+    if todo:
+        shapes = [getattr(system, field).shape for field in SHARED]
+        block = shared_memory.SharedMemory(
+            create=True,
+            size=sum(8 * int(np.prod(shape)) for shape in shapes),
+        )
+        try:
+            offset = 0
+            for field, shape in zip(SHARED, shapes):
+                array = np.ndarray(shape, dtype=np.float64, buffer=block.buf,
+                                   offset=offset)
+                array[:] = getattr(system, field)
+                offset += array.nbytes
+
+            # the template carries everything except the shared arrays
+            template = copy.copy(system)
+            template.executor = None
+            for field in SHARED:
+                setattr(template, field, None)
+            template = copy.deepcopy(template)
+
+            with ProcessPoolExecutor(
+                max_workers=processes, initializer=_attach,
+                initargs=(block.name, shapes, template),
+            ) as executor:
+                futures = {
+                    i: executor.submit(_run, configs[i], duration, every)
+                    for i in todo
+                }
+                for i, future in futures.items():
+                    results[i], positions[i] = future.result()
+                    results[i]["cached"] = False
+
+                    if fnames[i] is not None:
+                        metrics = np.frombuffer(
+                            json.dumps(results[i]).encode("utf-8"),
+                            dtype=np.uint8,
+                        )
+                        writeAtomic(
+                            fnames[i],
+                            lambda fp: np.savez(fp, metrics=metrics,
+                                                positions=positions[i]),
+                        )
+        finally:
+            block.close()
+            block.unlink()
+
+    # compare the final positions with those of the smallest time step in
+    # each group of otherwise identical configurations
+    groups = {}
+    for i, config in enumerate(configs):
+        key = json.dumps(
+            {k: v for k, v in config.items() if k != "deltaT"}, sort_keys=True
+        )
+        groups.setdefault(key, []).append(i)
+
+    for group in groups.values():
+        reference = positions[min(group, key=lambda i: configs[i]["deltaT"])]
+        com = np.average(reference, axis=0, weights=system.masses)
+        scale = np.sqrt(np.mean(np.sum((reference - com)**2, axis=1)))
+        for i in group:
+            results[i]["positionDifference"] = np.max(
+                np.linalg.norm(positions[i] - reference, axis=1)
+            ) / scale
+
+    return results
+
+
+def formatTable(results):
+    """
+    Return a table of the results of a sweep as a string.
+    """
+
+    rows = [COLUMNS] + [
+        tuple(
+            f"{result[column]:.3e}" if isinstance(result[column], float)
+            else str(result[column])
+            for column in COLUMNS
+        )
+        for result in results
+    ]
+    widths = [max(len(row[k]) for row in rows) for k in range(len(COLUMNS))]
+
+    return "\n".join(
+        " ".join(value.rjust(width) for value, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run a particle simulation for a grid of configurations "
+        "in parallel and print a summary table."
+    )
+    parser.add_argument("checkpoint", help="checkpoint file holding the "
+                        "initial state of the system")
+    parser.add_argument("--duration", type=float, required=True,
+                        help="length of time to simulate (s)")
+    for name, type_ in PARAMETERS.items():
+        parser.add_argument(f"--{name}", type=type_, nargs="+",
+                            help=f"values of {name} to try")
+    parser.add_argument("--every", type=int, default=10,
+                        help="steps between conservation samples")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument("--cache", default=None,
+                        help="directory for cached results")
+    parser.add_argument("--csv", default=None,
+                        help="also write the table to this CSV file")
+    args = parser.parse_args(args)
+
+    grid = {
+        name: getattr(args, name) for name in PARAMETERS
+        if getattr(args, name) is not None
+    }
+    if "deltaT" not in grid:
+        parser.error("at least one --deltaT value is required")
+
+    system = loadCheckpoint(args.checkpoint)
+    results = sweep(system, args.duration, every=args.every,
+                    processes=args.processes, cachedir=args.cache, **grid)
+
+    print(formatTable(results))
+
+    if args.csv is not None:
+        with open(args.csv, "w", encoding="utf-8") as fp:
+            fp.write(",".join(COLUMNS) + "\n")
+            for result in results:
+                fp.write(",".join(str(result[c]) for c in COLUMNS) + "\n")
+
+
+if __name__ == "__main__":
+    main()
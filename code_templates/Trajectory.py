@@ -0,0 +1,256 @@
+"""
+Record the trajectories of the particles in a `ParticleSystem` to disk while
+a simulation runs, and read them back afterwards.
+
+The recorder stores the times, positions and velocities in preallocated
+blocks, which are written to a directory as compressed chunk files when they
+fill up, so memory use does not grow with the length of the run and at most
+one block is lost if the run dies. For example:
+
+>>> with TrajectoryRecorder("orbit", system, every=10) as recorder:
+...     for i in range(100000):
+...         system.update(deltaT)
+...         recorder.record(system)
+>>> trajectory = TrajectoryReader("orbit")
+>>> x = trajectory.memmap("positions")[:, 0, 0]
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+METAFILE = "meta.json"
+FIELDS = ("times", "positions", "velocities")
+
+
+# the mask applied to the permissions of new files, so that temporary files
+# (which are created private) can be given the usual permissions
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def temporaryFile(fname):
+    """
+    Create a new, uniquely named temporary file in the same directory as
+    `fname`, so that it can be renamed over it, and return its file
+    descriptor and name. Several processes writing the same file therefore
+    never share a temporary file.
+    """
+
+    fd, tmpname = tempfile.mkstemp(
+        prefix=os.path.basename(fname) + ".", suffix=".tmp",
+        dir=os.path.dirname(os.path.abspath(fname)),
+    )
+    os.chmod(tmpname, 0o666 & ~UMASK)
+    return fd, tmpname
+
+
+def writeAtomic(fname, write):
+    """
+    Write a file by calling write(fileobject) on a temporary file and then
+    renaming it, so that a crash never leaves a partly written file.
+    """
+
+    fd, tmpname = temporaryFile(fname)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            write(fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmpname, fname)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+
+
+class TrajectoryRecorder:
+    """
+    Record the state of a particle system at regular steps.
+
+    Parameters
+    ----------
+    dirname: str
+        The directory to write the trajectory to. It is created if it does
+        not exist.
+    system: ParticleSystem
+        The system being recorded (used for the particle names and masses).
+    every: int
+        Only record every `every`th call to `record`. Defaults to 1.
+    blocksize: int
+        The number of records held in memory before they are written out.
+        Defaults to 1000.
+    compress: bool
+        Whether to compress the chunk files. Defaults to True.
+    append: bool
+        If True, add to an existing trajectory in `dirname` (e.g., when
+        restarting a simulation) rather than starting a new one.
+    """
+
+    def __init__(self, dirname, system, every=1, blocksize=1000,
+                 compress=True, append=False):
+        if every < 1 or blocksize < 1:
+            raise ValueError("every and blocksize must be positive integers")
+
+        self.dirname = dirname
+        self.every = every
+        self.blocksize = blocksize
+        self.compress = compress
+
+        os.makedirs(dirname, exist_ok=True)
+        metafile = os.path.join(dirname, METAFILE)
+        if append and os.path.exists(metafile):
+            with open(metafile, encoding="utf-8") as fp:
+                self.meta = json.load(fp)
+            if self.meta["names"] != list(system.names):
+                raise ValueError("Cannot append a different system to an "
+                                 "existing trajectory")
+        else:
+            self.meta = {
+                "names": list(system.names),
+                "masses": system.masses.tolist(),
+                "every": every,
+                "chunks": [],
+            }
+            self.writeMeta()
+
+        N = len(system)
+        self.times = np.empty(blocksize)
+        self.positions = np.empty((blocksize, N, 3))
+        self.velocities = np.empty((blocksize, N, 3))
+        self.nbuffered = 0
+        self.ncalls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, system):
+        """
+        Record the current state of the system (if this is an `every`th
+        call).
+        """
+
+        self.ncalls += 1
+        if (self.ncalls - 1) % self.every:
+            return
+
+        self.times[self.nbuffered] = system.time
+        self.positions[self.nbuffered] = system.positions
+        self.velocities[self.nbuffered] = system.velocities
+        self.nbuffered += 1
+
+        if self.nbuffered == self.blocksize:
+            self.flush()
+
+    __call__ = record
+
+    def flush(self):
+        """
+        Write any buffered records to a new chunk file.
+        """
+
+        if self.nbuffered == 0:
+            return
+
+        fname = f"chunk{len(self.meta['chunks']):06d}.npz"
+        arrays = {
+            field: getattr(self, field)[:self.nbuffered] for field in FIELDS
+        }
+        save = np.savez_compressed if self.compress else np.savez
+        writeAtomic(os.path.join(self.dirname, fname),
+                    lambda fp: save(fp, **arrays))
+
+        self.meta["chunks"].append([fname, self.nbuffered])
+        self.writeMeta()
+        self.nbuffered = 0
+
+    def close(self):
+        self.flush()
+
+    def writeMeta(self):
+        writeAtomic(
+            os.path.join(self.dirname, METAFILE),
+            lambda fp: fp.write(json.dumps(self.meta).encode("utf-8")),
+        )
+
+
+class TrajectoryReader:
+    """
+    Read a trajectory written by a `TrajectoryRecorder`.
+
+    Parameters
+    ----------
+    dirname: str
+        The directory containing the trajectory.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        with open(os.path.join(dirname, METAFILE), encoding="utf-8") as fp:
+            self.meta = json.load(fp)
+
+        self.names = self.meta["names"]
+        self.masses = np.array(self.meta["masses"])
+
+    def __len__(self):
+        return sum(n for _, n in self.meta["chunks"])
+
+    def chunks(self):
+        """
+        Iterate over the chunks, yielding a dictionary of the times,
+        positions and velocities in each. Only one chunk is held in memory
+        at a time.
+        """
+
+        for fname, _ in self.meta["chunks"]:
+            with np.load(os.path.join(self.dirname, fname)) as data:
+                yield {field: data[field] for field in FIELDS}
+
+    @property
+    def times(self):
+        return np.concatenate([chunk["times"] for chunk in self.chunks()])
+
+    def memmap(self, field="positions"):
+        """
+        Return a memory-mapped array of all the records of a field
+        ("times", "positions" or "velocities"). The chunks are decompressed
+        one at a time into a single uncompressed ".npy" file in the
+        trajectory directory, which is reused on later calls unless more
+        records have been added. The array is read from disk as it is
+        accessed, so it can be larger than the available memory.
+        """
+
+        if field not in FIELDS:
+            raise ValueError(f"Field must be one of {', '.join(FIELDS)}")
+
+        fname = os.path.join(self.dirname, f"{field}.npy")
+        if os.path.exists(fname):
+            array = np.load(fname, mmap_mode="r")
+            if len(array) == len(self):
+                return array
+            del array
+
+        shape = (len(self),) + (() if field == "times" else
+                                (len(self.names), 3))
+        fd, tmpname = temporaryFile(fname)
+        os.close(fd)
+        try:
+            array = np.lib.format.open_memmap(tmpname, mode="w+",
+                                              shape=shape)
+            first = 0
+            for chunk in self.chunks():
+                array[first:first + len(chunk[field])] = chunk[field]
+                first += len(chunk[field])
+            array.flush()
+            del array
+            os.replace(tmpname, fname)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+        return np.load(fname, mmap_mode="r")
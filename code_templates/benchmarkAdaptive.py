@@ -0,0 +1,39 @@
+"""
+Compare the number of function evaluations and the time taken by the uniform
+(trapezium and centre rectangle) and locally adaptive integration methods in
+Integration.py for a function with a sharp peak.
+"""
+
+from Integration import Integration
+import math
+import os
+
+
+def peak(x):
+    """A broad background with a narrow Lorentzian peak at x = 0.7."""
+    return math.sin(x) + 1.0 / (1.0 + ((x - 0.7) / 1e-3)**2)
+
+
+if __name__ == "__main__":
+    a, b = 0.0, 2.0
+    exact = 1.0 - math.cos(b) + 1e-3 * (
+        math.atan((b - 0.7) / 1e-3) - math.atan((a - 0.7) / 1e-3)
+    )
+
+    integral = Integration(peak, eps=1e-7)
+
+    print(f"{'method':>20} {'evaluations':>12} {'time (s)':>10} "
+          f"{'error':>10}")
+
+    for method in (1, 3):
+        integral.setMethod(method)
+        result = integral.evaluate(a, b)
+        name = integral.integrationMethod.__name__
+        print(f"{name:>20} {integral.nevals:>12} {integral.walltime:>10.4g} "
+              f"{abs(result - exact):>10.3g}")
+
+    for processes in (1, os.cpu_count()):
+        result = integral.evaluateAdaptive(a, b, processes=processes)
+        name = f"adaptive ({processes} proc)"
+        print(f"{name:>20} {integral.nevals:>12} {integral.walltime:>10.4g} "
+              f"{abs(result - exact):>10.3g}")
@@ -0,0 +1,79 @@
+"""
+Compare the accuracy and speed of the Barnes-Hut and direct summation force
+solvers in ParticleSystem for N = 10^3 to 10^5 particles and a range of
+opening angles. The direct summation forces are calculated for a random
+sample of particles and, for large N, the direct step time is extrapolated
+from the time taken for the sample.
+"""
+
+from ParticleSystem import ParticleSystem
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+import numpy as np
+
+
+def directSample(system, sample):
+    """Direct summation accelerations for a sample of the particles."""
+    separation = (
+        system.positions[None, :, :] - system.positions[sample, None, :]
+    )
+    distance2 = np.einsum("ijk,ijk->ij", separation, separation)
+    distance2[np.arange(len(sample)), sample] = np.inf
+    return system.G * np.einsum(
+        "ij,ijk->ik", system.masses / distance2**1.5, separation
+    )
+
+
+def plummer(N, rng):
+    """A Plummer sphere of N solar mass stars with a 1 pc scale radius."""
+    radius = 3.086e16 / np.sqrt(rng.random(N)**(-2 / 3) - 1)
+    direction = rng.normal(size=(N, 3))
+    direction /= np.linalg.norm(direction, axis=1)[:, None]
+    return ParticleSystem(
+        radius[:, None] * direction,
+        np.zeros((N, 3)),
+        np.full(N, 2e30),
+        integrator="verlet",
+    )
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    nsample = 1000
+    processes = os.cpu_count()
+
+    print(f"{processes} processes available")
+    print(f"{'N':>7} {'theta':>6} {'median err':>11} {'99% err':>9} "
+          f"{'BH step (s)':>12} {f'BH x{processes} (s)':>12} "
+          f"{'direct (s)':>11} {'speed-up':>9}")
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for N in [1000, 10000, 30000, 100000]:
+            system = plummer(N, rng)
+            sample = rng.choice(N, size=min(N, nsample), replace=False)
+
+            start = time.perf_counter()
+            reference = directSample(system, sample)
+            directtime = (time.perf_counter() - start) * N / len(sample)
+
+            for theta in [0.3, 0.5, 0.8]:
+                system.setForceSolver("barneshut", theta=theta)
+                start = time.perf_counter()
+                accelerations = system.accelerationsAt(system.positions)
+                bhtime = time.perf_counter() - start
+
+                system.setForceSolver("barneshut", theta=theta,
+                                      executor=executor)
+                start = time.perf_counter()
+                system.accelerationsAt(system.positions)
+                pooltime = time.perf_counter() - start
+
+                error = np.linalg.norm(
+                    accelerations[sample] - reference, axis=1
+                ) / np.linalg.norm(reference, axis=1)
+
+                print(f"{N:>7} {theta:>6} {np.median(error):>11.3g} "
+                      f"{np.percentile(error, 99):>9.3g} {bhtime:>12.4g} "
+                      f"{pooltime:>12.4g} {directtime:>11.4g} "
+                      f"{directtime / bhtime:>9.1f}")
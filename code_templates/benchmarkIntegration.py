@@ -0,0 +1,81 @@
+"""
+Compare the time taken by the scalar and vectorised centre rectangle rules
+in Integration.py (which Integration.evaluate refines with) for N = 10^3 to
+10^7 intervals, and for a batch of integrals evaluated with
+Integration.evaluate.
+"""
+
+from Integration import Integration
+import math
+import time
+import numpy as np
+
+
+def timeit(func, *args):
+    """Return the result of func(*args) and the time taken in seconds."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+a, b = 0.0, math.pi
+
+print(f"{'N':>10} {'scalar (s)':>12} {'array (s)':>12} {'speed-up':>10}")
+for power in range(3, 8):
+    N = 10**power
+    Is, ts = timeit(Integration.crect, a, b, N, math.sin)
+    Iv, tv = timeit(
+        Integration.vcrect, np.array([a]), np.array([b]), N, np.sin
+    )
+
+    # check both paths give the same answer
+    assert abs(Is - Iv[0]) < 1e-9
+
+    print(f"{N:>10} {ts:>12.4g} {tv:>12.4g} {ts / tv:>10.1f}")
+
+# a batch of integrals of sin(x) from 0 to b for many different upper bounds
+M = 1000
+upper = np.linspace(0.1, 2 * math.pi, M)
+
+scalar = Integration(math.sin, eps=1e-6)
+_, ts = timeit(lambda: [scalar.evaluate(0.0, ub) for ub in upper])
+
+vector = Integration(np.sin, eps=1e-6)
+results, tv = timeit(vector.evaluate, np.zeros(M), upper)
+
+print()
+print(f"{M} integrals with evaluate: scalar {ts:.4g} s, batch {tv:.4g} s "
+      f"(speed-up {ts / tv:.1f})")
+print(f"maximum error: {np.max(np.abs(results - (1 - np.cos(upper)))):.3g}")
+
+# count the function calls needed to reach eps when re-evaluating every point
+# at each doubling of N, compared with reusing the previous function values
+ncalls = 0
+
+
+def counted(x):
+    global ncalls
+    ncalls += 1
+    return x * math.exp(-x)
+
+
+print()
+print(f"{'method':>8} {'naive calls':>12} {'reused calls':>12} {'ratio':>6}")
+for method in range(1, 5):
+    integral = Integration(counted, method=method, eps=1e-6)
+
+    ncalls = 0
+    N = 1
+    result = integral.integrationMethod(0.0, 3.0, N, counted)
+    while True:
+        N *= 2
+        previous = result
+        result = integral.integrationMethod(0.0, 3.0, N, counted)
+        if abs(result - previous) < integral.eps:
+            break
+    naive = ncalls
+
+    integral.evaluate(0.0, 3.0)
+    name = integral.integrationMethod.__name__
+    print(f"{name:>8} {naive:>12} {integral.nevals:>12} "
+          f"{naive / integral.nevals:>6.1f}")
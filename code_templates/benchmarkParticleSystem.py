@@ -0,0 +1,64 @@
+"""
+Compare the time per step of the array-based ParticleSystem with a loop over a
+list of Particle objects, for N = 10 to 10^4 particles.
+"""
+
+from ParticleSystem import ParticleSystem, Particle
+import time
+import numpy as np
+
+
+def listUpdate(particles, deltaT):
+    """Update a list of particles with a Python loop over all pairs."""
+    G = ParticleSystem.G
+    for p in particles:
+        acceleration = np.zeros(3)
+        for q in particles:
+            if q is not p:
+                separation = q.position - p.position
+                distance = np.linalg.norm(separation)
+                acceleration += G * q.mass * separation / distance**3
+        p.acceleration = acceleration
+
+    for p in particles:
+        p.update(deltaT)
+
+
+def random_system(N, rng):
+    """A cluster of N Sun-like stars in a 1 pc sphere."""
+    return ParticleSystem(
+        rng.normal(scale=3e16, size=(N, 3)),
+        rng.normal(scale=1e3, size=(N, 3)),
+        np.full(N, 2e30),
+    )
+
+
+rng = np.random.default_rng(42)
+deltaT = 3e10
+
+print(f"{'N':>6} {'array (steps/s)':>16} {'list (steps/s)':>16} "
+      f"{'speed-up':>10}")
+for N in [10, 30, 100, 300, 1000, 3000, 10000]:
+    system = random_system(N, rng)
+
+    nsteps = max(1, 20000 // N)
+    start = time.perf_counter()
+    for _ in range(nsteps):
+        system.update(deltaT)
+    arrayrate = nsteps / (time.perf_counter() - start)
+
+    if N <= 300:
+        particles = [
+            Particle(position=p.position, velocity=p.velocity,
+                     acceleration=p.acceleration, name=p.name, mass=p.mass)
+            for p in random_system(N, rng)
+        ]
+        nsteps = max(1, 3000 // N**2 * 10)
+        start = time.perf_counter()
+        for _ in range(nsteps):
+            listUpdate(particles, deltaT)
+        listrate = nsteps / (time.perf_counter() - start)
+        print(f"{N:>6} {arrayrate:>16.4g} {listrate:>16.4g} "
+              f"{arrayrate / listrate:>10.1f}")
+    else:
+        print(f"{N:>6} {arrayrate:>16.4g} {'-':>16} {'-':>10}")
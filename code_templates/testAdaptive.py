@@ -0,0 +1,36 @@
+from AdaptiveStepping import evolve, groundImpact
+from ParticleSystem import ParticleSystem
+import numpy as np
+
+
+# a ball thrown from a height of 100 m in a uniform gravitational field, as in
+# testParticle.py, but stopping exactly when it hits the ground
+Ball = ParticleSystem(
+    positions=[[0, 100, 0]],
+    velocities=[[20, 50, 0]],
+    masses=[500.],
+    names=["Ball"],
+    externalAcceleration=[0, -10, 0],  # g=-10 m/s^2 in y-direction
+)
+
+times = []
+y = []
+
+
+def record(system):
+    times.append(system.time)
+    y.append(system.positions[0, 1])
+
+
+found, accepted, rejected = evolve(
+    Ball, 100.0, 1e-3, events=[groundImpact()], callback=record
+)
+
+# analytical time of impact from y = 100 + 50 t - 5 t^2 = 0
+exact = (50 + np.sqrt(50**2 + 4 * 5 * 100)) / 10
+
+print(found)
+print(f"impact time {Ball.time} (error {Ball.time - exact:.3g} s)")
+print(f"{accepted} accepted and {rejected} rejected steps, compared with "
+      f"{int(np.ceil(exact / 1e-3))} fixed steps of 1 ms")
+print(f"{Ball.forceEvaluations} force evaluations")
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 
-import math
 import textwrap as tw
 
+import numpy as np
+
 
 def test_function(x):
-    """Function whose roots we seek."""
-    return math.e**(-x) * (x*(x + 5) + 2.0) + 1.0
+    """Function whose roots we seek (x can be a number or an array)."""
+    return np.exp(-x) * (x*(x + 5) + 2.0) + 1.0
 
 
 def bisection(fun, xrange, toll = 1e-12, niter = 1000):
@@ -79,9 +80,135 @@ def bisection(fun, xrange, toll = 1e-12, niter = 1000):
     return c, fc, n
 
 
-xrange = [-1.0, 0.0]
-sol, fsol, niter = bisection(test_function, xrange)
+def bisection_many(fun, a, b, args=(), toll=1e-12, niter=1000,
+                   method="bisection"):
+    """
+    A function that finds the roots of a function in many intervals at once.
+    All the intervals are stepped together with NumPy array operations, and
+    each one is dropped as soon as it has converged, so the function is only
+    evaluated for the intervals that are still being solved.
+
+    Parameters:
+    -----------
+    fun: callable
+        the function to be solved, called as fun(x, *args) with arrays of
+        points and of the matching parameters, and returning an array
+
+    a, b: array_like
+        the two ends of the intervals where the 0 of the function lies
+
+    args: tuple
+        arrays of parameters of the function for each interval (broadcast
+        with a and b), defaults to no parameters
+
+    toll: float
+        tolerance between two iterations, defaults to 1e-12
+
+    niter: integer
+        maximum number of iterations, defaults to 1000
+
+    method: str
+        "bisection" to halve the intervals at each iteration, or "illinois"
+        for the Illinois variant of the false position method, which takes
+        the point where the straight line between the ends crosses 0 and so
+        converges in far fewer iterations for smooth functions, defaults to
+        "bisection"
+
+    Returns:
+    --------
+    c: array
+       roots of the given equation with toll precision
+
+    fc: array
+       values of the given function at c (approximately 0.0)
+
+    n: array
+       number of iterations done to reach each solution
+
+    """
+    if method not in ("bisection", "illinois"):
+        raise ValueError("method must be 'bisection' or 'illinois'")
+
+    a, b, *args = np.broadcast_arrays(
+        np.asarray(a, dtype=float), np.asarray(b, dtype=float),
+        *[np.asarray(p) for p in args]
+    )
+    shape = a.shape
+    a = a.ravel()
+    b = b.ravel()
+    args = [p.ravel() for p in args]
+
+    fa = np.broadcast_to(fun(a, *args), a.shape).astype(float)
+    fb = np.broadcast_to(fun(b, *args), b.shape).astype(float)
+
+    nbad = np.count_nonzero(~(fa * fb < 0.0))
+    if nbad:
+        raise ValueError(f"The provided function does not contain zeros in "
+                         f"{nbad} of the given intervals")
+
+    c = np.empty(a.shape)
+    fc = np.empty(a.shape)
+    n = np.zeros(a.shape, dtype=int)
+
+    # the indices of the intervals still being solved, and their state
+    lanes = np.arange(a.size)
+    c_old = a.copy()
+
+    for i in range(1, niter + 1):
+        if method == "illinois":
+            x = b - fb * (b - a) / (fb - fa)
+
+            # fall back to bisection if rounding puts the point outside
+            outside = ~((x > np.minimum(a, b)) & (x < np.maximum(a, b)))
+            x[outside] = 0.5 * (a[outside] + b[outside])
+        else:
+            x = (a + b) / 2
+
+        fx = np.broadcast_to(fun(x, *args), x.shape).astype(float)
+
+        if method == "illinois":
+            # keep the end where the function has the other sign, halving its
+            # value if it is kept twice in a row to stop it getting stuck
+            swap = fx * fb < 0.0
+            a = np.where(swap, b, a)
+            fa = np.where(swap, fb, 0.5 * fa)
+            b = x
+            fb = fx
+        else:
+            left = fa * fx < 0.0
+            b = np.where(left, x, b)
+            fb = np.where(left, fx, fb)
+            a = np.where(left, a, x)
+            fa = np.where(left, fa, fx)
+
+        done = (np.abs(x - c_old) <= toll) | (fx == 0.0)
+        c_old = x
+
+        finished = lanes[done]
+        c[finished] = x[done]
+        fc[finished] = fx[done]
+        n[finished] = i
+
+        keep = ~done
+        lanes = lanes[keep]
+        if not lanes.size:
+            break
+
+        a, fa, b, fb = a[keep], fa[keep], b[keep], fb[keep]
+        c_old = c_old[keep]
+        args = [p[keep] for p in args]
+
+    if lanes.size:
+        raise ValueError(f"Maximum number of iterations reached for "
+                         f"{lanes.size} intervals")
+
+    return c.reshape(shape), fc.reshape(shape), n.reshape(shape)
+
+
+if __name__ == "__main__":
+    xrange = [-1.0, 0.0]
+    sol, fsol, niter = bisection(test_function, xrange)
 
-print(tw.fill(f"The root of your function is approximately x = {sol}, where "
-              f"the function value is {fsol}.  This solution has been reached "
-              f"after {niter} bisection iterations."))
+    print(tw.fill(f"The root of your function is approximately x = {sol}, "
+                  f"where the function value is {fsol}.  This solution has "
+                  f"been reached after {niter} bisection iterations."))
@@ -1,5 +1,14 @@
+import json
+import struct
+import zipfile
+
 import numpy as np
-from scipy.interpolate import interp2d
+from scipy.interpolate import RegularGridInterpolator
+
+
+# identifies files written by ElectricField.save
+FORMAT = "ElectricField"
+VERSION = 1
 
 
 class ElectricField:
@@ -32,40 +41,322 @@ class ElectricField:
 
         self.label = label
 
+    @property
+    def E(self):
+        return self._E
+
+    @E.setter
+    def E(self, value):
+        self._E = value
+        self.invalidate()
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = value
+        self.invalidate()
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = value
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Discard the cached interpolators and gradient. This is done
+        automatically when `E`, `x` or `y` are set, but must be called after
+        changing their values in place (e.g., `field.E[0, 0] = 1.0`).
+        """
+
+        self._interpolator = None
+        self._gradient = None
+        self._gradientInterpolators = None
+
+    # cached values that are not pickled
+    CACHED = ("_interpolator", "_gradient", "_gradientInterpolators")
+
+    def __getstate__(self):
+        # do not pickle the cached interpolators and gradient
+        state = self.__dict__.copy()
+        for name in self.CACHED:
+            state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        # objects pickled before E, x and y were properties store them under
+        # their own names
+        for name in ("E", "x", "y"):
+            if name in state:
+                state["_" + name] = state.pop(name)
+        for name in self.CACHED:
+            state[name] = None
+        self.__dict__.update(state)
+
+    def _makeInterpolator(self, values):
+        # a linear interpolator of values on the grid points, which must be
+        # in ascending order (the grid is only
+        # reordered if needed, so a memory-mapped grid is not copied)
+        x, y = self.x, self.y
+        if np.any(np.diff(x) < 0) or np.any(np.diff(y) < 0):
+            xorder = np.argsort(x)
+            yorder = np.argsort(y)
+            x, y = x[xorder], y[yorder]
+            values = values[np.ix_(xorder, yorder)]
+
+        return RegularGridInterpolator(
+            (x, y), values, method="linear", bounds_error=True
+        )
+
+    @property
+    def interpolator(self):
+        """
+        A linear interpolator of the field on the grid, which is created the
+        first time it is needed and then reused.
+        """
+
+        if self._interpolator is None:
+            self._interpolator = self._makeInterpolator(self.E)
+
+        return self._interpolator
+
+    def max(self):
+        """
+        Return the maximum electric field strength on the grid.
+        """
+
+        return self.E.max()
+
+    def min(self):
+        """
+        Return the minimum electric field strength on the grid.
+        """
+
+        return self.E.min()
+
+    def mean(self):
+        """
+        Return the mean electric field strength on the grid points.
+        """
+
+        return self.E.mean()
+
+    def gradient(self):
+        """
+        Return the gradient of the electric field strength on the grid, as
+        calculated by `np.gradient` (central differences in the interior and
+        one-sided differences at the edges).
+
+        Returns
+        -------
+        tuple
+            Arrays of the x and y components of the gradient. They are calculated once and then reused until the
+            field changes.
+        """
+
+        if self._gradient is None:
+            self._gradient = tuple(
+                np.gradient(self.E.astype(float), self.x, self.y)
+            )
+
+        return self._gradient
+
+    def gradient_many(self, points):
+        """
+        Return the gradient of the electric field strength at many points,
+        interpolated from the gradient grids.
+
+        Parameters
+        ----------
+        points: array
+            An (M, 2) array of x-y coordinate positions.
+
+        Returns
+        -------
+        array
+            An (M, 2) array of the x and y components of the gradient.
+        """
+
+        points = self._checkPoints(points)
+
+        if self._gradientInterpolators is None:
+            self._gradientInterpolators = [
+                self._makeInterpolator(g) for g in self.gradient()
+            ]
+
+        try:
+            return np.column_stack(
+                [interp(points) for interp in self._gradientInterpolators]
+            )
+        except ValueError:
+            raise ValueError("Some x-y coordinates are outside grid bounds.")
+
+    def line_integral(self, paths, order=4):
+        """
+        Return the integral of the electric field strength with respect to
+        distance along each of a set of paths. All the paths are evaluated
+        with one interpolation call.
+
+        Parameters
+        ----------
+        paths: list
+            A list of (K, 2) arrays of the x-y coordinates of the vertices of
+            each path, which is made of straight segments between them, or a
+            single (P, K, 2) array of P paths.
+        order: int
+            The number of Gauss-Legendre points used on each segment.
+            Default is 4.
+
+        Returns
+        -------
+        array
+            The integral along each path.
+        """
+
+        starts, ends, index, npaths = pathSegments(paths)
+        points, weights = gaussPoints(starts, ends, order)
+
+        values = self.field_strength_many(points).reshape(-1, order)
+        lengths = np.linalg.norm(ends - starts, axis=1)
+
+        return np.bincount(index, weights=(values @ weights) * lengths,
+                           minlength=npaths)
+
+    def flux(self, contours, order=4):
+        """
+        Return the outward flux of the gradient of the electric field
+        strength through each of a set of closed contours, i.e., the integral
+        of the gradient dotted with the outward normal around the contour.
+
+        Parameters
+        ----------
+        contours: list
+            A list of (K, 2) arrays of the x-y coordinates of the vertices of
+            each contour in anticlockwise order (the last vertex is joined to
+            the first), or a single (P, K, 2) array of P contours.
+        order: int
+            The number of Gauss-Legendre points used on each segment.
+            Default is 4.
+
+        Returns
+        -------
+        array
+            The flux through each contour.
+        """
+
+        starts, ends, index, ncontours = pathSegments(contours, closed=True)
+        points, weights = gaussPoints(starts, ends, order)
+
+        gradients = self.gradient_many(points).reshape(-1, order, 2)
+
+        # outward normals (for anticlockwise contours) with the segment
+        # lengths as their lengths
+        delta = ends - starts
+        normals = np.column_stack([delta[:, 1], -delta[:, 0]])
+
+        return np.bincount(
+            index,
+            weights=np.einsum("ijk,ik,j->i", gradients, normals, weights),
+            minlength=ncontours,
+        )
+
     def save(self, fname=None):
         """
-        Save the class to a NumPy pickle file.
+        Save the field to an uncompressed NumPy ".npz" file holding the `E`,
+        `x` and `y` arrays and a small JSON header with the label. No
+        pickling is used, so the file is safe to load from anywhere.
 
         Parameters
         ----------
         fname: str
             The output file name for storing the class. If not given the
-            `label` attribute of the class will be used and ".npy" will be
+            `label` attribute of the class will be used and ".npz" will be
             extension.
         """
 
         if fname is None:
             fname = self.label
 
-        np.save(fname, self, allow_pickle=True)
+        header = json.dumps(
+            {"format": FORMAT, "version": VERSION, "label": self.label}
+        )
+
+        np.savez(
+            fname,
+            E=self.E,
+            x=self.x,
+            y=self.y,
+            header=np.frombuffer(header.encode("utf-8"), dtype=np.uint8),
+        )
 
     @classmethod
-    def load(cls, fname):
+    def load(cls, fname, mmap=False, allow_pickle=False):
         """
-        Load a saved file containing an instance of this class. The file will
-        be a NumPy pickle object with a ".npy" extension.
+        Load a saved file containing an instance of this class.
 
         Parameters
         ----------
         fname: str
             The name of the file to load
-        
+        mmap: bool
+            If True, the E grid is memory-mapped rather than read into
+            memory, so only the parts that are used are read from disk.
+        allow_pickle: bool
+            If True, files in the old pickle format (a ".npy" file written by
+            earlier versions of `save`) can be loaded. Only do this for
+            trusted files, as loading a pickle can run arbitrary code. Use
+            `migrate` to convert them to the new format.
+
         Returns
         -------
         ElectricField
             An ElectricField object.
         """
 
+        if not zipfile.is_zipfile(fname):
+            if not allow_pickle:
+                raise ValueError(
+                    f"{fname} is not in the ElectricField format. If it is a "
+                    "trusted file saved by an old version, convert it with "
+                    "ElectricField.migrate."
+                )
+            return cls._loadPickle(fname)
+
+        with np.load(fname, allow_pickle=False) as data:
+            if "header" not in data.files:
+                raise TypeError("Loaded file does not contain an ElectricField")
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            if header.get("format") != FORMAT:
+                raise TypeError("Loaded file does not contain an ElectricField")
+            if header.get("version", 0) > VERSION:
+                raise ValueError(f"{fname} was saved by a newer version of "
+                                 "ElectricField")
+
+            x = data["x"]
+            y = data["y"]
+            E = memmapNpz(fname, "E") if mmap else data["E"]
+
+        # bypass __init__ so that a memory-mapped grid is not copied
+        field = cls.__new__(cls)
+        field.E = E
+        field.x = x
+        field.y = y
+        field.label = header["label"]
+
+        if field.E.shape != (len(field.x), len(field.y)):
+            raise ValueError("Shape of E is not consistent with grid points")
+
+        return field
+
+    @classmethod
+    def _loadPickle(cls, fname):
+        # load a file in the old pickle format
         E = np.load(fname, allow_pickle=True)
 
         # NumPy load will load the data as a 0-D NumPy array, so extract the
@@ -78,6 +369,32 @@ class ElectricField:
 
         return E
 
+    @classmethod
+    def migrate(cls, fname, newfname=None):
+        """
+        Convert a trusted file in the old pickle format to the new format.
+
+        Parameters
+        ----------
+        fname: str
+            The old ".npy" file.
+        newfname: str
+            The new file name. Defaults to `fname` with a ".npz" extension.
+
+        Returns
+        -------
+        ElectricField
+            The loaded ElectricField object.
+        """
+
+        field = cls._loadPickle(fname)
+
+        if newfname is None:
+            newfname = fname[:-4] if fname.endswith(".npy") else fname
+        field.save(newfname)
+
+        return field
+
     def field_strength(self, x, y):
         """
         Return the electric field strength at any point (interpolated if not
@@ -96,13 +413,139 @@ class ElectricField:
             The electric field strength at the given point.
         """
 
-        # create interpolator
-        fieldinterp = interp2d(self.x, self.y, self.E, bounds_error=True)
-
         try:
-            E = fieldinterp(x, y)[0]
+            E = self.interpolator([[x, y]])[0]
         except ValueError:
             raise ValueError(f"x-y coordinates ({x}, {y}) are outside grid "
                              "bounds.")
 
         return E
+
+    @staticmethod
+    def _checkPoints(points):
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("Points must be an (M, 2) array of x-y "
+                             "coordinates")
+        return points
+
+    def field_strength_many(self, points):
+        """
+        Return the electric field strength at many points at once.
+
+        Parameters
+        ----------
+        points: array
+            An (M, 2) array of x-y coordinate positions.
+
+        Returns
+        -------
+        array
+            The M electric field strengths at the given points.
+        """
+
+        points = self._checkPoints(points)
+
+        try:
+            E = self.interpolator(points)
+        except ValueError:
+            raise ValueError("Some x-y coordinates are outside grid bounds.")
+
+        return E
+
+
+def pathSegments(paths, closed=False):
+    """
+    Split a set of paths made of straight segments into their segments.
+
+    Parameters
+    ----------
+    paths: list
+        A list of (K, 2) arrays of path vertices, or a (P, K, 2) array.
+    closed: bool
+        Whether the last vertex of each path is joined to the first.
+
+    Returns
+    -------
+    tuple
+        (S, 2) arrays of the start and end points of all the segments, the
+        index of the path each segment belongs to, and the number of paths.
+    """
+
+    starts = []
+    ends = []
+    index = []
+    for i, path in enumerate(paths):
+        path = np.asarray(path, dtype=float)
+        if path.ndim != 2 or path.shape[1] != 2 or len(path) < 2:
+            raise ValueError("Each path must be a (K, 2) array of at least two "
+                             "x-y coordinates")
+        if closed:
+            path = np.vstack([path, path[:1]])
+        starts.append(path[:-1])
+        ends.append(path[1:])
+        index.append(np.full(len(path) - 1, i))
+
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty(0, dtype=int), 0
+
+    return (np.concatenate(starts), np.concatenate(ends),
+            np.concatenate(index), len(paths))
+
+
+def gaussPoints(starts, ends, order):
+    """
+    Return the Gauss-Legendre points on each of a set of segments, as an
+    (S * order, 2) array, and the weights for a unit length segment.
+    """
+
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    t = 0.5 * (nodes + 1)
+    points = starts[:, None, :] + t[None, :, None] * (ends - starts)[:, None, :]
+
+    return points.reshape(-1, 2), 0.5 * weights
+
+
+def memmapNpz(fname, name):
+    """
+    Memory-map an array stored in an uncompressed ".npz" file, by finding
+    where its data starts within the zip archive.
+
+    Parameters
+    ----------
+    fname: str
+        The ".npz" file name.
+    name: str
+        The name of the array.
+
+    Returns
+    -------
+    numpy.memmap
+        A read-only memory-mapped array.
+    """
+
+    with zipfile.ZipFile(fname) as archive:
+        info = archive.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"Array {name} in {fname} is compressed so cannot be "
+                         "memory-mapped")
+
+    with open(fname, "rb") as fp:
+        # skip the zip local file header, whose name and extra field lengths
+        # are the last fields of its fixed 30 byte part
+        fp.seek(info.header_offset)
+        namelen, extralen = struct.unpack("<HH", fp.read(30)[26:])
+        fp.seek(namelen + extralen, 1)
+
+        version = np.lib.format.read_magic(fp)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(fp)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(fp)
+        offset = fp.tell()
+
+    if dtype.hasobject:
+        raise ValueError(f"Array {name} in {fname} cannot be memory-mapped")
+
+    return np.memmap(fname, dtype=dtype, mode="r", shape=shape,
+                     order="F" if fortran else "C", offset=offset)
@@ -1,50 +1,227 @@
 #!/usr/bin/env python3
 
+import hashlib
+import math
+import os
+import tempfile
+from dataclasses import dataclass, fields
+
 import numpy as np
 import matplotlib.pyplot as plt
 
-# read density.txt and store data into a numpy two-dimensional array
-data_file = 'density.txt'
-density = np.loadtxt(data_file)
-
-# read data_description.txt and store information in the proper variables
-with open('data_description.txt',encoding='utf-8') as file:
-    for line in file:
-        idx = line.index("=")
-        if "xmin" in line:
-            xmin = float(line[idx+1:-1])
-        elif "xmax" in line:
-            xmax = float(line[idx+1:-1])
-        elif "ymin" in line:
-            ymin = float(line[idx+1:-1])
-        elif "ymax" in line:
-            ymax = float(line[idx+1:-1])
-        elif "xlabel" in line:
-            xlabel = line[idx+1:-1]
-        elif "ylabel" in line:
-            ylabel = line[idx+1:-1]
-        elif "clabel" in line:
-            clabel = line[idx+1:-1]
-
-# create a pseudocolor plot
-fig = plt.figure()
-
-ax = fig.add_subplot(111)
-
-c = ax.imshow(
-    density,
-    cmap='viridis',
-    extent=[xmin, xmax, ymin, ymax],
-    interpolation='antialiased',
-    origin='lower'
+# where load_density caches the parsed grids, out of the way of the data
+CACHEDIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"),
+                                                  ".cache")),
+    "plot_density",
 )
-ax.set_xlabel(xlabel, fontsize=20)
-ax.set_ylabel(ylabel, fontsize=20)
-ax.tick_params(labelsize=20)
-cbar = fig.colorbar(c)
-cbar.set_label(clabel, fontsize=20)
-cbar.ax.tick_params(labelsize=20)
 
-fig.tight_layout()
 
-plt.show()
+@dataclass
+class DensityDescription:
+    """The axes ranges and labels of a density map, as given in a
+    description file of "name = value" lines."""
+
+    xmin: float
+    xmax: float
+    ymin: float
+    ymax: float
+    xlabel: str = ""
+    ylabel: str = ""
+    clabel: str = ""
+
+    @classmethod
+    def read(cls, fname):
+        """
+        Read a description file, converting each value to the type of its
+        field.
+        """
+
+        types = {field.name: field.type for field in fields(cls)}
+        values = {}
+        with open(fname, encoding='utf-8') as file:
+            for line in file:
+                if "=" not in line:
+                    continue
+                name, value = (part.strip() for part in line.split("=", 1))
+                if name in types:
+                    values[name] = types[name](value)
+
+        return cls(**values)
+
+    @property
+    def extent(self):
+        return [self.xmin, self.xmax, self.ymin, self.ymax]
+
+
+def load_density(data_file, cache=True, cachedir=None):
+    """
+    Read a text file of a two-dimensional grid of numbers. The numbers are
+    parsed by the C reader of `pandas.read_csv` if pandas is installed, or
+    otherwise by `np.loadtxt` (which is also written in C from NumPy 1.23).
+    The grid is then saved in a binary ".npy" file in a cache directory
+    (named after the path of the text file), which is memory-mapped instead
+    on later calls (unless the text file has changed), so the text only has
+    to be parsed once.
+
+    Parameters
+    ----------
+    data_file: str
+        The name of the text file.
+    cache: bool
+        Whether to use and write the binary file. Default is True.
+    cachedir: str
+        The directory for the binary files. Default is `CACHEDIR`, i.e.,
+        "plot_density" in the user's cache directory.
+
+    Returns
+    -------
+    array
+        The two-dimensional grid.
+    """
+
+    cachedir = CACHEDIR if cachedir is None else cachedir
+    key = hashlib.sha256(os.path.abspath(data_file).encode("utf-8"))
+    cached = os.path.join(cachedir, key.hexdigest()[:32] + ".npy")
+    if (
+        cache and os.path.exists(cached)
+        and os.path.getmtime(cached) >= os.path.getmtime(data_file)
+    ):
+        return np.load(cached, mmap_mode='r')
+
+    try:
+        import pandas as pd
+    except ImportError:
+        density = np.loadtxt(data_file, ndmin=2)
+    else:
+        density = pd.read_csv(
+            data_file, sep=r"\s+", header=None, comment="#", dtype=float,
+            engine="c", float_precision="round_trip"
+        ).to_numpy()
+
+    if cache:
+        # write to a temporary file of our own first, as other processes may
+        # be caching the same file at the same time
+        os.makedirs(cachedir, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(suffix=".npy", dir=cachedir)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.save(file, density)
+            os.replace(tmpname, cached)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+    return density
+
+
+def downsample(density, extent, shape):
+    """
+    Reduce a grid to at most the given shape by averaging blocks of grid
+    points. Rows and columns left over at the top and right edges are
+    dropped, and the extent is adjusted to match.
+
+    Parameters
+    ----------
+    density: array
+        The two-dimensional grid.
+    extent: list
+        The [xmin, xmax, ymin, ymax] extent of the grid.
+    shape: tuple
+        The maximum number of rows and columns, e.g., the size of the plot
+        in pixels.
+
+    Returns
+    -------
+    tuple
+        The reduced grid and its extent.
+    """
+
+    nrows, ncols = density.shape
+    frows = max(1, math.ceil(nrows / shape[0]))
+    fcols = max(1, math.ceil(ncols / shape[1]))
+    if frows == 1 and fcols == 1:
+        return density, extent
+
+    rows = nrows // frows * frows
+    cols = ncols // fcols * fcols
+    reduced = density[:rows, :cols].reshape(
+        rows // frows, frows, cols // fcols, fcols
+    ).mean(axis=(1, 3))
+
+    xmin, xmax, ymin, ymax = extent
+    extent = [
+        xmin, xmin + (xmax - xmin) * cols / ncols,
+        ymin, ymin + (ymax - ymin) * rows / nrows,
+    ]
+
+    return reduced, extent
+
+
+def plot_density(density, description, fig=None, fontsize=20):
+    """
+    Create a pseudocolor plot of a density map. Grids with many more points
+    than the plot has pixels are downsampled first.
+
+    Parameters
+    ----------
+    density: array
+        The two-dimensional grid.
+    description: DensityDescription
+        The axes ranges and labels.
+    fig: Figure
+        The figure to draw on (it is cleared). Default is a new figure.
+    fontsize: int
+        The font size of the labels. Default is 20.
+
+    Returns
+    -------
+    Figure
+        The figure.
+    """
+
+    if fig is None:
+        fig = plt.figure()
+    else:
+        fig.clf()
+
+    ax = fig.add_subplot(111)
+
+    # keep at most two grid points per pixel of the axes, which is enough
+    # for the antialiasing to work with
+    bbox = ax.get_position()
+    width, height = fig.get_size_inches() * fig.dpi
+    shape = (max(1, int(2 * bbox.height * height)),
+             max(1, int(2 * bbox.width * width)))
+    density, extent = downsample(density, description.extent, shape)
+
+    c = ax.imshow(
+        density,
+        cmap='viridis',
+        extent=extent,
+        interpolation='antialiased',
+        origin='lower'
+    )
+    ax.set_xlabel(description.xlabel, fontsize=fontsize)
+    ax.set_ylabel(description.ylabel, fontsize=fontsize)
+    ax.tick_params(labelsize=fontsize)
+    cbar = fig.colorbar(c)
+    cbar.set_label(description.clabel, fontsize=fontsize)
+    cbar.ax.tick_params(labelsize=fontsize)
+
+    fig.tight_layout()
+
+    return fig
+
+
+if __name__ == "__main__":
+    # read density.txt and store data into a numpy two-dimensional array
+    density = load_density('density.txt')
+
+    # read data_description.txt into a description object
+    description = DensityDescription.read('data_description.txt')
+
+    # create a pseudocolor plot
+    plot_density(density, description)
+
+    plt.show()
@@ -144,36 +144,52 @@ class Square:
             Give True if the point is in the square and False otherwise.
         """
 
-        # rotate the square and the point, so they are aligned with the x-y axes
-        vec1 = [1, 0]  # unit vector on x-axis
-        vec2 = self.vertices[1] - self.vertices[0]  # a side of the square
+        return bool(self.contains([point])[0])
 
-        # angle between one of the squares sides and the x-axis
-        angle = self.vertex_angle(vec1, vec2)
+    @property
+    def frame(self):
+        """
+        The frame of the square used for containment tests: its first
+        vertex and the two sides leading from it, as the rows of a 2x2
+        array, with their squared lengths. It is calculated once and then
+        reused.
+        """
 
-        # rotated square
-        rotsquare = self.rotate_square(angle)
+        if getattr(self, "_frame", None) is None:
+            origin = self.vertices[0].astype(float)
+            axes = np.array([self.vertices[1] - origin,
+                             self.vertices[3] - origin])
+            self._frame = (origin, axes, np.sum(axes**2, axis=1))
 
-        # rotated test point about the centre
-        rot = np.array(
-            [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
-        )
-        rotpoint = np.dot(rot, point - self.centre)
+        return self._frame
 
-        # check point is within the square
-        bottom = rotsquare.side("bottom")
-        top = rotsquare.side("top")
-        if rotpoint[1] < bottom[0][1] or rotpoint[1] > top[0][1]:
-            # outside y-extent of square
-            return False
+    def contains(self, points):
+        """
+        Check which of a set of points are in the square (including its
+        edges). Each point is projected onto the two sides of the square
+        leading from its first vertex, so it is inside if both projections
+        are between zero and the side length.
 
-        left = rotsquare.side("left")
-        right = rotsquare.side("right")
-        if rotpoint[0] < left[0][0] or rotpoint[0] > right[0][0]:
-            # outside x-extent of square
-            return False
+        Parameters
+        ----------
+        points: array
+            An (M, 2) array of the x, y coordinates of the points to test.
 
-        return True
+        Returns
+        -------
+        array
+            A boolean array that is True for the points in the square.
+        """
+
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("Points must be an (M, 2) array of x-y "
+                             "coordinates")
+
+        origin, axes, lengths2 = self.frame
+        projections = (points - origin) @ axes.T
+
+        return np.all((projections >= 0) & (projections <= lengths2), axis=1)
 
     def rotate_square(self, angle):
         """
@@ -242,3 +258,364 @@ class Square:
         idxs = [idx, (idx + 1) % 4]
 
         return self.vertices[idxs]
+
+
+class SquareArray:
+    """
+    A collection of K squares stored as a single (K, 4, 2) array of vertices,
+    so that they can be validated, rotated and measured together with array
+    operations rather than one `Square` at a time.
+
+    Parameters
+    ----------
+    vertices: array
+        A (K, 4, 2) array of the x-y coordinates of the four corners of each
+        square, which must be consecutive corners in either the clockwise or
+        anticlockwise direction.
+    """
+
+    def __init__(self, vertices):
+        # store copy of vertices as numpy array
+        self.vertices = np.array(vertices, dtype=float)
+
+        if self.vertices.ndim != 3 or self.vertices.shape[1:] != (4, 2):
+            raise ValueError("Vertices must be a (K, 4, 2) array")
+
+        # check all the squares are valid
+        valid = self.valid_squares()
+        if not np.all(valid):
+            raise ValueError(
+                "Input coordinates do not define valid squares at indices "
+                f"{np.flatnonzero(~valid).tolist()}"
+            )
+
+        self._setup()
+
+    @classmethod
+    def from_squares(cls, squares):
+        """
+        Create a SquareArray from a list of `Square` objects.
+        """
+
+        return cls([square.vertices for square in squares])
+
+    @classmethod
+    def _from_valid(cls, vertices):
+        # create a SquareArray from vertices known to be valid squares
+        squares = cls.__new__(cls)
+        squares.vertices = vertices
+        squares._setup()
+        return squares
+
+    def _setup(self):
+        # get the centres of the squares
+        self.centres = (self.vertices[:, 0] + self.vertices[:, 2]) / 2.0
+        self._frame = None
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or not np.isscalar(index):
+            return self._from_valid(self.vertices[index])
+
+        # a Square whose vertices are a view of this array
+        square = Square.__new__(Square)
+        square.vertices = self.vertices[index]
+        square.centre = self.centres[index]
+        return square
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def valid_squares(self):
+        """
+        Check which of the vertex sets define valid squares: all sides are
+        the same length and all corners are 90 degrees (to the same
+        tolerances as `Square.valid_square`).
+
+        Returns
+        -------
+        array
+            A boolean array that is True for the valid squares.
+        """
+
+        # vectors along each side, and from each vertex to the previous one
+        sides = np.roll(self.vertices, -1, axis=1) - self.vertices
+        previous = -np.roll(sides, 1, axis=1)
+
+        lengths = np.linalg.norm(sides, axis=2)
+        equal = np.all(
+            np.isclose(lengths, lengths[:, :1]), axis=1
+        )
+
+        cosines = np.einsum("kij,kij->ki", sides, previous) / (
+            lengths * np.roll(lengths, 1, axis=1)
+        )
+        with np.errstate(invalid="ignore"):
+            angles = np.arccos(cosines)
+        square = np.all(np.isclose(angles, np.pi / 2.0), axis=1)
+
+        return equal & square
+
+    def side_lengths(self):
+        """
+        Return the side length of each square.
+        """
+
+        return np.linalg.norm(self.vertices[:, 1] - self.vertices[:, 0],
+                              axis=1)
+
+    def area(self):
+        """
+        Return the area of each square.
+        """
+
+        return self.side_lengths() ** 2
+
+    def perimeter(self):
+        """
+        Return the perimeter of each square.
+        """
+
+        return self.side_lengths() * 4
+
+    def bounds(self):
+        """
+        Return a (K, 4) array of the bounding box of each square, as
+        [xmin, ymin, xmax, ymax].
+        """
+
+        return np.concatenate(
+            [self.vertices.min(axis=1), self.vertices.max(axis=1)], axis=1
+        )
+
+    def rotate(self, angle):
+        """
+        Return a new SquareArray with each square rotated about its centre.
+
+        Parameters
+        ----------
+        angle: (float, array)
+            An angle in radians to rotate all the squares by, or an array of
+            K angles, one for each square.
+
+        Returns
+        -------
+        SquareArray
+            The rotated squares.
+        """
+
+        angle = np.broadcast_to(np.asarray(angle, dtype=float), (len(self),))
+        cos, sin = np.cos(angle), np.sin(angle)
+        rot = np.stack([np.stack([cos, -sin], axis=1),
+                        np.stack([sin, cos], axis=1)], axis=1)
+
+        relative = self.vertices - self.centres[:, None, :]
+        rotverts = np.einsum("kij,kvj->kvi", rot, relative)
+
+        return self._from_valid(rotverts + self.centres[:, None, :])
+
+    @property
+    def frame(self):
+        """
+        The frames of the squares used for containment tests (see
+        `Square.frame`), as arrays of the K origins, (K, 2, 2) side vectors
+        and (K, 2) squared side lengths. They are calculated once and then
+        reused.
+        """
+
+        if self._frame is None:
+            origins = self.vertices[:, 0]
+            axes = np.stack([self.vertices[:, 1] - origins,
+                             self.vertices[:, 3] - origins], axis=1)
+            self._frame = (origins, axes, np.sum(axes**2, axis=2))
+
+        return self._frame
+
+    def contains(self, points, chunksize=2**22):
+        """
+        Check which of a set of points are in each square (including its
+        edges).
+
+        Parameters
+        ----------
+        points: array
+            An (M, 2) array of the x, y coordinates of the points to test.
+        chunksize: int
+            The approximate number of square-point pairs tested at once,
+            which bounds the memory used for intermediate arrays.
+
+        Returns
+        -------
+        array
+            A (K, M) boolean array that is True where point m is in square k.
+        """
+
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("Points must be an (M, 2) array of x-y "
+                             "coordinates")
+
+        origins, axes, lengths2 = self.frame
+
+        # projections of the points onto each side are (p - o).a = p.a - o.a
+        offsets = np.einsum("kj,kij->ki", origins, axes)
+
+        inside = np.empty((len(self), len(points)), dtype=bool)
+        rows = max(1, chunksize // max(1, len(points)))
+        for first in range(0, len(self), rows):
+            last = min(first + rows, len(self))
+            block = inside[first:last]
+            block[:] = True
+            for i in range(2):
+                projections = axes[first:last, i] @ points.T
+                projections -= offsets[first:last, i, None]
+                block &= projections >= 0
+                block &= projections <= lengths2[first:last, i, None]
+
+        return inside
+
+
+def expand_ranges(starts, counts):
+    """
+    Return the indices start, start + 1, ..., start + count - 1 for each pair
+    of values in `starts` and `counts`, concatenated into one array.
+
+    This is the same as `expandRanges` in code_templates/BarnesHut.py. It is
+    repeated rather than imported because this file is included whole as an
+    exercise solution in docs/exercises.md, so it must run on its own.
+    """
+
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(np.sum(counts))
+
+
+class SquareIndex:
+    """
+    A spatial index for finding which of many squares contain each of many
+    points. The plane is divided into a uniform grid of cells and each
+    square is listed in every cell that its bounding box overlaps, so a
+    point only has to be tested against the squares listed in its own cell.
+
+    Parameters
+    ----------
+    squares: (SquareArray, list)
+        The squares to index, as a SquareArray or a list of Square objects.
+    cellsize: float
+        The width of the grid cells. Default is the median width of the
+        squares' bounding boxes (enlarged if needed so that there are at
+        most about four cells per square).
+    """
+
+    def __init__(self, squares, cellsize=None):
+        if not isinstance(squares, SquareArray):
+            squares = SquareArray.from_squares(squares)
+        self.squares = squares
+
+        bounds = squares.bounds()
+        self.lower = bounds[:, :2].min(axis=0)
+        extent = np.maximum(bounds[:, 2:].max(axis=0) - self.lower, 1e-300)
+
+        if cellsize is None:
+            cellsize = np.median(np.max(bounds[:, 2:] - bounds[:, :2], axis=1))
+        cellsize = max(cellsize, np.sqrt(np.prod(extent) / (4 * len(squares))),
+                       1e-300)
+        self.cellsize = cellsize
+        self.shape = tuple(int(n) + 1 for n in np.floor(extent / cellsize))
+
+        # ranges of cells overlapped by each bounding box
+        lo = self._cells(bounds[:, :2])
+        hi = self._cells(bounds[:, 2:])
+        nx = hi[:, 0] - lo[:, 0] + 1
+        ny = hi[:, 1] - lo[:, 1] + 1
+
+        # (cell, square) pairs, listing every cell of every bounding box
+        square = np.repeat(np.arange(len(squares)), nx * ny)
+        k = expand_ranges(np.zeros(len(squares), dtype=int), nx * ny)
+        ix = lo[square, 0] + k // ny[square]
+        iy = lo[square, 1] + k % ny[square]
+        cell = ix * self.shape[1] + iy
+
+        # sort the pairs by cell, with the start of each cell's list in
+        # cellstart
+        order = np.argsort(cell, kind="stable")
+        self.cellsquares = square[order]
+        self.cellstart = np.searchsorted(
+            cell[order], np.arange(self.shape[0] * self.shape[1] + 1)
+        )
+
+    def _cells(self, points):
+        # the (unclipped) grid cell coordinates of points
+        return np.floor((points - self.lower) / self.cellsize).astype(int)
+
+    def query(self, points, chunksize=2**20):
+        """
+        Find which squares contain each point (including their edges).
+
+        Parameters
+        ----------
+        points: array
+            An (M, 2) array of the x, y coordinates of the points.
+        chunksize: int
+            The approximate number of candidate point-square pairs tested at
+            once, which bounds the memory used.
+
+        Returns
+        -------
+        tuple
+            Arrays of the point indices and square indices of every
+            point-square pair where the point is in the square, sorted by
+            point.
+        """
+
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("Points must be an (M, 2) array of x-y "
+                             "coordinates")
+
+        # candidate squares of each point are those listed in its cell
+        cells = self._cells(points)
+        ingrid = np.all((cells >= 0) & (cells < self.shape), axis=1)
+        cell = np.where(ingrid, cells[:, 0] * self.shape[1] + cells[:, 1], 0)
+        starts = self.cellstart[cell]
+        counts = np.where(ingrid, self.cellstart[cell + 1] - starts, 0)
+
+        origins, axes, lengths2 = self.squares.frame
+
+        pointidx = []
+        squareidx = []
+        batch = np.cumsum(counts) // chunksize
+        bounds = np.flatnonzero(np.diff(batch, prepend=-1, append=-2))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            c = counts[lo:hi]
+            pp = np.repeat(np.arange(lo, hi), c)
+            ss = self.cellsquares[expand_ranges(starts[lo:hi], c)]
+
+            projections = np.einsum(
+                "kj,kij->ki", points[pp] - origins[ss], axes[ss]
+            )
+            inside = np.all(
+                (projections >= 0) & (projections <= lengths2[ss]), axis=1
+            )
+            pointidx.append(pp[inside])
+            squareidx.append(ss[inside])
+
+        return (np.concatenate(pointidx + [np.empty(0, dtype=int)]),
+                np.concatenate(squareidx + [np.empty(0, dtype=int)]))
+
+    def first(self, points):
+        """
+        Return the index of the first square containing each point, or -1 if
+        it is not in any square.
+        """
+
+        pointidx, squareidx = self.query(points)
+
+        result = np.full(len(points), -1)
+        order = np.lexsort((squareidx, pointidx))
+        found, firstpair = np.unique(pointidx[order], return_index=True)
+        result[found] = squareidx[order][firstpair]
+
+        return result
@@ -32,6 +32,14 @@ class TicTacToe:
         self.grid = np.full((self.gridsize, self.gridsize), " ")
         self.linecount = 3  # number of lines to rewind by
 
+        # number of each player's counters in each row, column and diagonal,
+        # so a win can be spotted from the counts after each move
+        self.rowcounts = np.zeros((2, self.gridsize), dtype=int)
+        self.colcounts = np.zeros((2, self.gridsize), dtype=int)
+        self.diagcounts = np.zeros((2, 2), dtype=int)
+        self.nmoves = 0
+        self.winner = None  # index of the winning player
+
     def __call__(self):
         # start game
         self.drawgrid()
@@ -107,6 +115,7 @@ class TicTacToe:
 
         # fill in grid
         self.grid[self.gridsize - y][x - 1] = counters[playeridx]
+        self.updatecounts(self.gridsize - y, x - 1, playeridx)
 
         # draw the grid
         self.drawgrid()
@@ -114,34 +123,65 @@ class TicTacToe:
         # flip player
         self.currentplayer = not self.currentplayer
 
+    def updatecounts(self, row, col, playeridx):
+        """
+        Update the counts of the player's counters in the lines through a
+        newly filled grid point, and record the player as the winner if any
+        of the lines is now complete. This takes the same time whatever the
+        size of the grid.
+
+        Parameters
+        ----------
+        row: int
+            The row index of the grid point.
+        col: int
+            The column index of the grid point.
+        playeridx: int
+            The index of the player (0 or 1).
+        """
+
+        n = self.gridsize
+        self.nmoves += 1
+
+        self.rowcounts[playeridx, row] += 1
+        self.colcounts[playeridx, col] += 1
+        complete = (self.rowcounts[playeridx, row] == n
+                    or self.colcounts[playeridx, col] == n)
+
+        if row == col:
+            self.diagcounts[playeridx, 0] += 1
+            complete = complete or self.diagcounts[playeridx, 0] == n
+        if row + col == n - 1:
+            self.diagcounts[playeridx, 1] += 1
+            complete = complete or self.diagcounts[playeridx, 1] == n
+
+        if complete:
+            self.winner = playeridx
+
     def checkstate(self):
         """
-        Check whether anyone has won.
+        Check whether the game is over, because someone has won or the grid
+        is full (a draw).
+        """
+
+        return self.winner is not None or self.isdraw()
+
+    def isdraw(self):
+        """
+        Check whether the grid is full with no winner.
         """
 
-        # check if any rows are completed
-        complete = False
-        for row in (
-            [np.diag(self.grid), np.diag(np.fliplr(self.grid))]
-            + list(self.grid)
-            + list(np.transpose(self.grid))
-        ):
-            # ignore "empty" rows
-            if not np.all(row == " "):
-                # check if all values in row are the same
-                if np.all(row == row[0]):
-                    complete = True
-                    break
-
-        return complete
+        return self.winner is None and self.nmoves == self.gridsize**2
 
     def showwinner(self):
         """
         Show the winner.
         """
 
-        playeridx = int(not self.currentplayer)
-        print(f"The winner is {self.players[playeridx]}!")
+        if self.isdraw():
+            print("It's a draw!")
+        else:
+            print(f"The winner is {self.players[self.winner]}!")
 
 
 # run the game if calling the code directly
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+
+"""
+A headless tic-tac-toe engine, which can be driven by programs rather than
+by typing moves, with a game-tree search player and a self-play runner for
+playing many games at once, e.g.
+
+>>> board = Board(3)
+>>> board.play(1, 1)
+>>> AlphaBetaPlayer()(board)
+(0, 0)
+
+or from the command line:
+
+    python tictactoe_engine.py --games 1000 --gridsize 3 --processes 4
+
+A game is won by filling a whole row, column or diagonal of the grid, as in
+the `TicTacToe` class.
+"""
+
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+_symmetries = {}
+
+
+def symmetries(gridsize):
+    """
+    Return an (8, gridsize**2) array of the flat grid indices of each
+    rotation and reflection of a grid, so that `cells.ravel()[perm]` is the
+    transformed grid for each row `perm`.
+    """
+
+    if gridsize not in _symmetries:
+        index = np.arange(gridsize**2).reshape(gridsize, gridsize)
+        _symmetries[gridsize] = np.array([
+            np.rot90(grid, k).ravel()
+            for grid in (index, index.T) for k in range(4)
+        ])
+
+    return _symmetries[gridsize]
+
+
+class Board:
+    """
+    The state of a game: an int8 grid holding 0 for empty points and 1 or
+    -1 for the first and second player's counters, and the number of each
+    player's counters in every row, column and diagonal, so that a win is
+    found in the same time whatever the grid size. These are the same
+    counters as `TicTacToe.updatecounts` keeps in tictactoe.py, repeated so
+    that the engine does not depend on the interactive game.
+
+    Parameters
+    ----------
+    gridsize: int
+        The size of the grid. Default is 3.
+    """
+
+    def __init__(self, gridsize=3):
+        if gridsize < 1:
+            raise ValueError("Grid size must be a positive integer")
+
+        self.gridsize = gridsize
+        self.cells = np.zeros((gridsize, gridsize), dtype=np.int8)
+
+        # number of each player's counters in each row, column and diagonal
+        self.rowcounts = np.zeros((2, gridsize), dtype=int)
+        self.colcounts = np.zeros((2, gridsize), dtype=int)
+        self.diagcounts = np.zeros((2, 2), dtype=int)
+
+        self.history = []  # moves played, as (row, col)
+        self.winner = None  # index of the winning player
+
+    @property
+    def nmoves(self):
+        return len(self.history)
+
+    @property
+    def player(self):
+        """The index of the player to move (0 or 1)."""
+        return self.nmoves % 2
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.gridsize = self.gridsize
+        board.cells = self.cells.copy()
+        board.rowcounts = self.rowcounts.copy()
+        board.colcounts = self.colcounts.copy()
+        board.diagcounts = self.diagcounts.copy()
+        board.history = list(self.history)
+        board.winner = self.winner
+        return board
+
+    def legal_moves(self):
+        """
+        Return a list of the (row, col) grid points that can be played.
+        """
+
+        if self.isover():
+            return []
+
+        rows, cols = np.nonzero(self.cells == 0)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def _count(self, row, col, playeridx, step):
+        # add step to the counts of the lines through (row, col), returning
+        # whether any of them is complete
+        n = self.gridsize
+        self.rowcounts[playeridx, row] += step
+        self.colcounts[playeridx, col] += step
+        complete = (self.rowcounts[playeridx, row] == n
+                    or self.colcounts[playeridx, col] == n)
+
+        if row == col:
+            self.diagcounts[playeridx, 0] += step
+            complete = complete or self.diagcounts[playeridx, 0] == n
+        if row + col == n - 1:
+            self.diagcounts[playeridx, 1] += step
+            complete = complete or self.diagcounts[playeridx, 1] == n
+
+        return complete
+
+    def play(self, row, col):
+        """
+        Place the current player's counter at a grid point.
+
+        Parameters
+        ----------
+        row: int
+            The row index of the grid point.
+        col: int
+            The column index of the grid point.
+        """
+
+        if self.isover():
+            raise ValueError("The game is over")
+        if not (0 <= row < self.gridsize and 0 <= col < self.gridsize):
+            raise ValueError("Grid point is outside the grid")
+        if self.cells[row, col] != 0:
+            raise ValueError("That grid point has already been used")
+
+        playeridx = self.player
+        self.cells[row, col] = 1 - 2 * playeridx
+        self.history.append((row, col))
+
+        if self._count(row, col, playeridx, 1):
+            self.winner = playeridx
+
+    def undo(self):
+        """
+        Take back the last move.
+        """
+
+        row, col = self.history.pop()
+        self.cells[row, col] = 0
+        self._count(row, col, self.player, -1)
+        self.winner = None
+
+    def isdraw(self):
+        """
+        Check whether the grid is full with no winner.
+        """
+
+        return self.winner is None and self.nmoves == self.gridsize**2
+
+    def isover(self):
+        """
+        Check whether the game is over, because someone has won or the grid
+        is full (a draw).
+        """
+
+        return self.winner is not None or self.nmoves == self.gridsize**2
+
+    def result(self):
+        """
+        Return 1 if the first player has won, -1 if the second player has
+        won, 0 for a draw, or None if the game is not over.
+        """
+
+        if self.winner is not None:
+            return 1 - 2 * self.winner
+        if self.isdraw():
+            return 0
+        return None
+
+    def canonical(self):
+        """
+        Return a key for the position that is the same for all of its
+        rotations and reflections, which have the same value.
+        """
+
+        # gather all eight images of the grid at once, and compare them as
+        # byte strings
+        m = self.gridsize**2
+        images = self.cells.ravel()[symmetries(self.gridsize)].tobytes()
+        return min(images[k * m:(k + 1) * m] for k in range(8))
+
+    def heuristic(self):
+        """
+        Estimate how good the position is for the player to move: lines that
+        only one player can still complete count for that player, weighted
+        by the square of the number of counters already in them.
+        """
+
+        counts = np.concatenate(
+            [self.rowcounts, self.colcounts, self.diagcounts], axis=1
+        )
+        scores = []
+        for me, other in ((0, 1), (1, 0)):
+            open_ = counts[other] == 0
+            scores.append(np.sum(counts[me][open_]**2))
+
+        score = scores[0] - scores[1]
+        return score if self.player == 0 else -score
+
+
+# transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class AlphaBetaPlayer:
+    """
+    A player that chooses moves by a negamax search with alpha-beta
+    pruning. Positions that have already been searched are stored in a
+    transposition table under a key that is the same for all rotations and
+    reflections of the grid, so each symmetric position is only searched
+    once.
+
+    Parameters
+    ----------
+    maxdepth: int
+        The maximum number of moves to search ahead, after which positions
+        are scored by `Board.heuristic`. Default is to search to the end of
+        the game, which is only feasible for small grids.
+    rng: numpy.random.Generator
+        A random number generator used to choose between equally good moves.
+        Default is to choose the first.
+    """
+
+    WIN = 10**6  # score of a won position (less the moves taken to win)
+
+    @classmethod
+    def shift(cls, score):
+        """
+        Move the score of a won or lost position one step towards 0, so that
+        quicker wins and slower losses score higher. Heuristic scores (far
+        smaller than `WIN`) are left alone.
+        """
+
+        if score > cls.WIN // 2:
+            return score - 1
+        if score < -cls.WIN // 2:
+            return score + 1
+        return score
+
+    @classmethod
+    def unshift(cls, score):
+        """
+        The inverse of `shift`, used to widen a search window to match.
+        """
+
+        if score > cls.WIN // 2:
+            return score + 1
+        if score < -cls.WIN // 2:
+            return score - 1
+        return score
+
+    def __init__(self, maxdepth=None, rng=None):
+        self.maxdepth = math.inf if maxdepth is None else maxdepth
+        self.rng = rng
+        self.table = {}
+        self.nodes = 0  # number of positions searched
+
+    def __call__(self, board):
+        """
+        Return the chosen (row, col) move for the player to move.
+        """
+
+        moves = self.ordered(board)
+        if not moves:
+            raise ValueError("There are no legal moves")
+
+        # to choose randomly between equally good moves, the window is kept
+        # open just below the best score so far, so that the scores of moves
+        # as good as the best are exact rather than bounds
+        margin = 0 if self.rng is None else 1
+
+        scores = []
+        alpha = -math.inf
+        for move in moves:
+            board.play(*move)
+            score = -self.negamax(board, self.maxdepth - 1, -math.inf, -alpha)
+            board.undo()
+            scores.append(score)
+            alpha = max(alpha, score - margin)
+
+        best = max(scores)
+        candidates = [m for m, s in zip(moves, scores) if s == best]
+        if self.rng is None:
+            return candidates[0]
+        return candidates[self.rng.integers(len(candidates))]
+
+    def ordered(self, board):
+        # try the moves nearest the centre first, as they are usually best
+        moves = board.legal_moves()
+        centre = (board.gridsize - 1) / 2
+        return sorted(moves, key=lambda m: abs(m[0] - centre)
+                      + abs(m[1] - centre))
+
+    def negamax(self, board, depth, alpha, beta):
+        """
+        Return the score of a position for the player to move, exactly if it
+        is between alpha and beta and otherwise as a bound.
+        """
+
+        self.nodes += 1
+
+        if board.winner is not None:
+            # the previous move won
+            return -self.WIN
+        if board.isdraw():
+            return 0
+        if depth <= 0:
+            return board.heuristic()
+
+        key = board.canonical()
+        entry = self.table.get(key)
+        if entry is not None and entry[2] >= depth:
+            value, bound = entry[0], entry[1]
+            if bound == EXACT:
+                return value
+            if bound == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        alpha0 = alpha
+        best = -math.inf
+        # the child's scores are shifted to prefer quicker wins and slower
+        # losses, so its window is shifted the other way to match
+        for move in self.ordered(board):
+            board.play(*move)
+            score = self.shift(-self.negamax(
+                board, depth - 1, -self.unshift(beta), -self.unshift(alpha)
+            ))
+            board.undo()
+
+            best = max(best, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best <= alpha0:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table[key] = (best, bound, depth)
+
+        return best
+
+
+class RandomPlayer:
+    """
+    A player that chooses a random legal move.
+    """
+
+    def __init__(self, rng=None):
+        self.rng = np.random.default_rng(rng)
+
+    def __call__(self, board):
+        moves = board.legal_moves()
+        return moves[self.rng.integers(len(moves))]
+
+
+def play_game(players, gridsize=3):
+    """
+    Play one game between two players (callables returning a move for a
+    board) and return the result (see `Board.result`).
+    """
+
+    board = Board(gridsize)
+    while not board.isover():
+        board.play(*players[board.player](board))
+
+    return board.result()
+
+
+# the players kept by each worker process, so their transposition tables are
+# reused between games
+_players = {}
+
+
+def _play_games(ngames, gridsize, maxdepth, epsilon, seed):
+    # worker task: play ngames between two search players that make random
+    # moves with probability epsilon, returning the number of first player
+    # wins, second player wins and draws
+    rng = np.random.default_rng(seed)
+    key = (gridsize, maxdepth)
+    if key not in _players:
+        _players[key] = AlphaBetaPlayer(maxdepth=maxdepth)
+    search = _players[key]
+    search.rng = rng
+    randomplayer = RandomPlayer(rng)
+
+    def player(board):
+        if rng.random() < epsilon:
+            return randomplayer(board)
+        return search(board)
+
+    totals = [0, 0, 0]
+    for _ in range(ngames):
+        result = play_game([player, player], gridsize=gridsize)
+        totals[{1: 0, -1: 1, 0: 2}[result]] += 1
+
+    return totals
+
+
+def selfplay(ngames, gridsize=3, maxdepth=None, epsilon=0.1, processes=None,
+             batchsize=100, seed=None):
+    """
+    Play many games of the search player against itself, shared between a
+    pool of worker processes.
+
+    Parameters
+    ----------
+    ngames: int
+        The number of games.
+    gridsize: int
+        The size of the grid. Default is 3.
+    maxdepth: int
+        The search depth (see `AlphaBetaPlayer`).
+    epsilon: float
+        The probability of each move being random rather than searched, so
+        that the games differ. Default is 0.1.
+    processes: int
+        The number of worker processes. Default is the number of cores. If
+        0, the games are played in this process.
+    batchsize: int
+        The number of games given to a worker at a time. Default is 100.
+    seed: int
+        A seed for the random number generators.
+
+    Returns
+    -------
+    dict
+        The numbers of "games", "wins" for each player and "draws", the
+        time taken in "seconds" and the "games_per_second".
+    """
+
+    sizes = [min(batchsize, ngames - first)
+             for first in range(0, ngames, batchsize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (sizes, [gridsize] * len(sizes), [maxdepth] * len(sizes),
+            [epsilon] * len(sizes), seeds)
+
+    start = time.perf_counter()
+    if processes == 0:
+        results = list(map(_play_games, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_play_games, *args))
+    seconds = time.perf_counter() - start
+
+    totals = np.sum(results, axis=0) if results else np.zeros(3, dtype=int)
+
+    return {
+        "games": ngames,
+        "wins": [int(totals[0]), int(totals[1])],
+        "draws": int(totals[2]),
+        "seconds": seconds,
+        "games_per_second": ngames / seconds if seconds > 0 else math.inf,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Play tic-tac-toe games between search players."
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--gridsize", type=int, default=3)
+    parser.add_argument("--maxdepth", type=int, default=None)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(args)
+
+    stats = selfplay(args.games, gridsize=args.gridsize,
+                     maxdepth=args.maxdepth, epsilon=args.epsilon,
+                     processes=args.processes, seed=args.seed)
+
+    print(f"{stats['games']} games: first player won {stats['wins'][0]}, "
+          f"second player won {stats['wins'][1]}, {stats['draws']} draws")
+    print(f"{stats['seconds']:.2f} s ({stats['games_per_second']:.1f} "
+          "games/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+import glob
+import json
+import os
+from collections import OrderedDict
+
+import functools
+
+import numpy as np
+
+from efield import ElectricField
+
+
+class TiledGrid:
+    """A 2D array stored on disk as fixed-size tiles, for grids that are too
+    large to hold in memory. Tiles are read when they are first needed and
+    kept in a least recently used (LRU) cache of at most `cachesize` tiles,
+    so reading part of the grid only touches the tiles that cover it.
+
+    The grid supports slicing (`grid[10:20, 5]`), assignment to slices,
+    gathering values at arrays of indices (`take`), and reductions that read
+    one tile at a time (`max`, `min`, `sum`, `mean`).
+
+    Parameters
+    ----------
+    dirname: str
+        The directory holding the tiles (created with `create` or
+        `fromArray`).
+    cachesize: int
+        The maximum number of tiles held in memory. Default is 16.
+    """
+
+    METAFILE = "tiles.json"
+
+    def __init__(self, dirname, cachesize=16):
+        with open(os.path.join(dirname, self.METAFILE), encoding="utf-8") as fp:
+            meta = json.load(fp)
+
+        self.dirname = dirname
+        self.shape = tuple(meta["shape"])
+        self.tileshape = tuple(meta["tileshape"])
+        self.dtype = np.dtype(meta["dtype"])
+        self.fill = meta["fill"]
+
+        if cachesize < 1:
+            raise ValueError("The cache must hold at least one tile")
+        self.cachesize = cachesize
+        self.cache = OrderedDict()
+        self.dirty = set()
+
+        # the number of tiles read from disk
+        self.loads = 0
+
+    @classmethod
+    def create(cls, dirname, shape, tileshape=(512, 512), dtype=float,
+               fill=0.0, cachesize=16):
+        """
+        Create a new tiled grid filled with a constant value. Tiles are only
+        written once they have been changed, and any tiles left in the
+        directory by an earlier grid are deleted.
+
+        Parameters
+        ----------
+        dirname: str
+            The directory to store the tiles in.
+        shape: tuple
+            The shape of the grid.
+        tileshape: tuple
+            The shape of each tile. Default is (512, 512).
+        dtype: dtype
+            The data type of the grid. Default is float.
+        fill: float
+            The initial value of every grid point. Default is 0.
+        cachesize: int
+            The maximum number of tiles held in memory.
+
+        Returns
+        -------
+        TiledGrid
+            The new grid.
+        """
+
+        if len(shape) != 2 or len(tileshape) != 2 or min(tileshape) < 1:
+            raise ValueError("The grid and tile shapes must be 2D")
+
+        os.makedirs(dirname, exist_ok=True)
+        for fname in glob.glob(os.path.join(dirname, "tile_*.npy")):
+            os.remove(fname)
+
+        meta = {
+            "shape": [int(n) for n in shape],
+            "tileshape": [int(n) for n in tileshape],
+            "dtype": np.dtype(dtype).str,
+            "fill": fill,
+        }
+        with open(os.path.join(dirname, cls.METAFILE), "w",
+                  encoding="utf-8") as fp:
+            json.dump(meta, fp)
+
+        return cls(dirname, cachesize=cachesize)
+
+    @classmethod
+    def fromArray(cls, dirname, array, tileshape=(512, 512), cachesize=16):
+        """
+        Create a tiled grid from a 2D array (which may itself be memory
+        mapped), writing it one tile at a time.
+        """
+
+        grid = cls.create(dirname, array.shape, tileshape=tileshape,
+                          dtype=array.dtype, cachesize=cachesize)
+        for ti, tj in grid.tiles():
+            rows, cols = grid.tileSlices(ti, tj)
+            grid.writeTile(ti, tj, np.asarray(array[rows, cols]))
+
+        return grid
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def ntiles(self):
+        return tuple(-(-n // t) for n, t in zip(self.shape, self.tileshape))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def __array__(self, dtype=None, copy=None):
+        # read the whole grid into memory
+        array = self[:, :]
+        return array if dtype is None else array.astype(dtype)
+
+    def tiles(self):
+        """
+        Iterate over the (row, column) indices of all the tiles.
+        """
+
+        for ti in range(self.ntiles[0]):
+            for tj in range(self.ntiles[1]):
+                yield ti, tj
+
+    def tileSlices(self, ti, tj):
+        """
+        Return the slices of the grid covered by a tile.
+        """
+
+        return tuple(
+            slice(t * n, min((t + 1) * n, size))
+            for t, n, size in zip((ti, tj), self.tileshape, self.shape)
+        )
+
+    def tileFile(self, ti, tj):
+        return os.path.join(self.dirname, f"tile_{ti}_{tj}.npy")
+
+    def tile(self, ti, tj):
+        """
+        Return a tile, reading it from disk if it is not in the cache.
+        """
+
+        key = (ti, tj)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        fname = self.tileFile(ti, tj)
+        if os.path.exists(fname):
+            data = np.load(fname, allow_pickle=False)
+            self.loads += 1
+        else:
+            rows, cols = self.tileSlices(ti, tj)
+            data = np.full(
+                (rows.stop - rows.start, cols.stop - cols.start), self.fill,
+                dtype=self.dtype,
+            )
+
+        self.cache[key] = data
+        while len(self.cache) > self.cachesize:
+            oldkey, olddata = self.cache.popitem(last=False)
+            if oldkey in self.dirty:
+                self._write(oldkey, olddata)
+
+        return data
+
+    def writeTile(self, ti, tj, data):
+        """
+        Write a whole tile straight to disk.
+        """
+
+        rows, cols = self.tileSlices(ti, tj)
+        data = np.asarray(data, dtype=self.dtype)
+        if data.shape != (rows.stop - rows.start, cols.stop - cols.start):
+            raise ValueError("Tile data has the wrong shape")
+
+        self.cache.pop((ti, tj), None)
+        self._write((ti, tj), data)
+
+    def _write(self, key, data):
+        fname = self.tileFile(*key)
+        with open(fname + ".tmp", "wb") as fp:
+            np.save(fp, data, allow_pickle=False)
+        os.replace(fname + ".tmp", fname)
+        self.dirty.discard(key)
+
+    def flush(self):
+        """
+        Write any changed tiles in the cache to disk.
+        """
+
+        for key in sorted(self.dirty):
+            self._write(key, self.cache[key])
+
+    def _ranges(self, key):
+        # convert an index into (start, stop) ranges for each axis, and
+        # whether each axis was indexed by an integer
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2:
+            raise IndexError("Too many indices for a 2D grid")
+        key = key + (slice(None),) * (2 - len(key))
+
+        ranges = []
+        squeeze = []
+        for k, size in zip(key, self.shape):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(size)
+                if step != 1:
+                    raise IndexError("Tiled grids only support slices with a "
+                                     "step of 1")
+                ranges.append((start, max(start, stop)))
+                squeeze.append(False)
+            else:
+                k = int(k)
+                if not -size <= k < size:
+                    raise IndexError("Grid index out of range")
+                k %= size
+                ranges.append((k, k + 1))
+                squeeze.append(True)
+
+        return ranges, squeeze
+
+    def _blocks(self, ranges):
+        # the tiles overlapping a rectangle, with the overlapping parts as
+        # slices of the tile and of the rectangle
+        (r0, r1), (c0, c1) = ranges
+        nr, nc = self.tileshape
+        for ti in range(r0 // nr, -(-r1 // nr)):
+            for tj in range(c0 // nc, -(-c1 // nc)):
+                lo = (max(r0, ti * nr), max(c0, tj * nc))
+                hi = (min(r1, (ti + 1) * nr), min(c1, (tj + 1) * nc))
+                yield (
+                    ti, tj,
+                    (slice(lo[0] - ti * nr, hi[0] - ti * nr),
+                     slice(lo[1] - tj * nc, hi[1] - tj * nc)),
+                    (slice(lo[0] - r0, hi[0] - r0),
+                     slice(lo[1] - c0, hi[1] - c0)),
+                )
+
+    def __getitem__(self, key):
+        ranges, squeeze = self._ranges(key)
+        out = np.empty([hi - lo for lo, hi in ranges], dtype=self.dtype)
+        for ti, tj, inner, outer in self._blocks(ranges):
+            out[outer] = self.tile(ti, tj)[inner]
+
+        return out[tuple(0 if s else slice(None) for s in squeeze)]
+
+    def __setitem__(self, key, value):
+        ranges, _ = self._ranges(key)
+        value = np.broadcast_to(
+            np.asarray(value, dtype=self.dtype),
+            [hi - lo for lo, hi in ranges],
+        )
+        for ti, tj, inner, outer in self._blocks(ranges):
+            self.tile(ti, tj)[inner] = value[outer]
+            self.dirty.add((ti, tj))
+
+    def take(self, i, j):
+        """
+        Return the values at arrays of row and column indices, reading each
+        tile that is needed once.
+        """
+
+        i, j = np.broadcast_arrays(np.asarray(i, dtype=int),
+                                   np.asarray(j, dtype=int))
+        out = np.empty(i.shape, dtype=self.dtype)
+        fi, fj, fout = i.ravel(), j.ravel(), out.reshape(-1)
+
+        ti = fi // self.tileshape[0]
+        tj = fj // self.tileshape[1]
+        tileid = ti * self.ntiles[1] + tj
+        order = np.argsort(tileid, kind="stable")
+        bounds = np.flatnonzero(np.diff(tileid[order], prepend=-1,
+                                        append=-1))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            idx = order[lo:hi]
+            tile = self.tile(ti[idx[0]], tj[idx[0]])
+            fout[idx] = tile[fi[idx] - ti[idx[0]] * self.tileshape[0],
+                             fj[idx] - tj[idx[0]] * self.tileshape[1]]
+
+        return out
+
+    def reduce(self, function):
+        """
+        Apply a reduction function (e.g., `np.max`) to each tile in turn and
+        return the list of results.
+        """
+
+        return [function(self.tile(ti, tj)) for ti, tj in self.tiles()]
+
+    def max(self):
+        return max(self.reduce(np.max))
+
+    def min(self):
+        return min(self.reduce(np.min))
+
+    def sum(self):
+        return sum(self.reduce(lambda tile: np.sum(tile, dtype=float)))
+
+    def mean(self):
+        return self.sum() / self.size
+
+    def gradient(self, x, y, dirnames):
+        """
+        Calculate the gradient of the grid with respect to the coordinates
+        of its rows and columns, like `np.gradient`, writing the two
+        components to new tiled grids. Each tile is differenced together
+        with a one point border from its neighbours, so only those tiles are
+        read and the result is the same as for the whole grid.
+
+        Parameters
+        ----------
+        x: array
+            The coordinates of the rows.
+        y: array
+            The coordinates of the columns.
+        dirnames: tuple
+            The directories for the two components of the gradient.
+
+        Returns
+        -------
+        tuple
+            The two TiledGrids of the gradient components.
+        """
+
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        outputs = [
+            TiledGrid.create(d, self.shape, tileshape=self.tileshape,
+                             dtype=float, cachesize=self.cachesize)
+            for d in dirnames
+        ]
+
+        for ti, tj in self.tiles():
+            rows, cols = self.tileSlices(ti, tj)
+            r0 = max(rows.start - 1, 0)
+            r1 = min(rows.stop + 1, self.shape[0])
+            c0 = max(cols.start - 1, 0)
+            c1 = min(cols.stop + 1, self.shape[1])
+
+            block = self[r0:r1, c0:c1].astype(float)
+            crop = (slice(rows.start - r0, rows.stop - r0),
+                    slice(cols.start - c0, cols.stop - c0))
+            for axis, (coords, lo, hi) in enumerate(((x, r0, r1),
+                                                     (y, c0, c1))):
+                if hi - lo > 1:
+                    component = np.gradient(block, coords[lo:hi], axis=axis)
+                else:
+                    component = np.zeros_like(block)
+                outputs[axis].writeTile(ti, tj, component[crop])
+
+        return tuple(outputs)
+
+
+def bilinear(x, y, values, points):
+    """
+    Bilinear interpolation on a grid, reading only the grid values at the
+    corners of the cells containing the points. This gives the same result
+    as a linear `RegularGridInterpolator`.
+
+    Parameters
+    ----------
+    x: array
+        The ascending x-positions of the grid points.
+    y: array
+        The ascending y-positions of the grid points.
+    values: array
+        The values on the grid, either an array or a `TiledGrid`.
+    points: array
+        An (M, 2) array of x-y coordinate positions.
+
+    Returns
+    -------
+    array
+        The M interpolated values.
+    """
+
+    points = np.asarray(points, dtype=float)
+    px, py = points[:, 0], points[:, 1]
+    if np.any((px < x[0]) | (px > x[-1]) | (py < y[0]) | (py > y[-1])):
+        raise ValueError("One of the requested points is out of bounds")
+
+    i = np.clip(np.searchsorted(x, px, side="right") - 1, 0, len(x) - 2)
+    j = np.clip(np.searchsorted(y, py, side="right") - 1, 0, len(y) - 2)
+    tx = (px - x[i]) / (x[i + 1] - x[i])
+    ty = (py - y[j]) / (y[j + 1] - y[j])
+
+    # the four corners of each cell, gathered in one pass over the tiles
+    ii = np.stack([i, i + 1, i, i + 1])
+    jj = np.stack([j, j, j + 1, j + 1])
+    if isinstance(values, TiledGrid):
+        corners = values.take(ii, jj)
+    else:
+        corners = values[ii, jj]
+
+    return (
+        (1 - tx) * (1 - ty) * corners[0] + tx * (1 - ty) * corners[1]
+        + (1 - tx) * ty * corners[2] + tx * ty * corners[3]
+    )
+
+
+class TiledElectricField(ElectricField):
+    """An `ElectricField` whose grid is a `TiledGrid` stored on disk, for
+    grids too large to hold in memory. Field strengths are interpolated
+    straight from the tiles (reading only those needed), and the reductions
+    and gradient are calculated one tile at a time.
+
+    Parameters
+    ----------
+    E: TiledGrid
+        The tiled grid of values of the electric field strength.
+    xpos: array
+        A 1D array of the ascending x-positions of the measurements.
+    ypos: array
+        A 1D array of the ascending y-positions of the measurements.
+    label: str
+        A label/name for the experiment. Default is "Efield"
+    """
+
+    def __init__(self, E, xpos, ypos, label="Efield"):
+        if not isinstance(E, TiledGrid):
+            raise TypeError("E must be a TiledGrid")
+
+        self.E = E
+        self.x = np.array(xpos)
+        self.y = np.array(ypos)
+
+        if self.E.shape != (len(self.x), len(self.y)):
+            raise ValueError("Shape of E is not consistent with grid points")
+        if np.any(np.diff(self.x) <= 0) or np.any(np.diff(self.y) <= 0):
+            raise ValueError("The grid points of a tiled field must be in "
+                             "ascending order")
+
+        self.label = label
+
+    @classmethod
+    def fromField(cls, field, dirname, tileshape=(512, 512), cachesize=16):
+        """
+        Create a tiled copy of an `ElectricField`.
+
+        Parameters
+        ----------
+        field: ElectricField
+            The field to copy.
+        dirname: str
+            The directory to store the tiles in.
+        tileshape: tuple
+            The shape of each tile. Default is (512, 512).
+        cachesize: int
+            The maximum number of tiles held in memory. Default is 16.
+        """
+
+        grid = TiledGrid.fromArray(dirname, field.E, tileshape=tileshape,
+                                   cachesize=cachesize)
+
+        return cls(grid, field.x, field.y, label=field.label)
+
+    def _makeInterpolator(self, values):
+        # interpolate directly from the tiles, reading only those needed
+        return functools.partial(bilinear, self.x, self.y, values)
+
+    def gradient(self, dirnames=None):
+        """
+        Return the gradient of the electric field strength on the grid, as
+        tiled grids (see `TiledGrid.gradient`).
+
+        Parameters
+        ----------
+        dirnames: tuple
+            The directories to store the two gradient components in. Default
+            is the tile directory with "_dx" and "_dy" appended.
+
+        Returns
+        -------
+        tuple
+            TiledGrids of the x and y components of the gradient. They are
+            calculated once and then reused until the field changes.
+        """
+
+        if self._gradient is None:
+            if dirnames is None:
+                base = self.E.dirname.rstrip("/\\")
+                dirnames = (base + "_dx", base + "_dy")
+            self._gradient = self.E.gradient(self.x, self.y, dirnames)
+
+        return self._gradient
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Render many figures without a display, sharing the work between a pool of
+worker processes. Each worker imports matplotlib (with the non-interactive
+Agg backend) once, and keeps one figure for each kind of plot, which is
+cleared and reused for every figure of that kind rather than creating a new
+one each time.
+
+Each figure is described by a dictionary ("spec") with a "kind" (one of the
+keys of `RENDERERS`), an "output" file name, an optional "dpi" for saving,
+and the arguments for that kind of plot, e.g.:
+
+    specs = [
+        {"kind": "density", "data": "density.txt",
+         "description": "data_description.txt", "output": "density.png"},
+        {"kind": "colortable", "colors": "BASE_COLORS",
+         "title": "Base Colors", "sort_colors": False, "emptycols": 1,
+         "output": "basecolors.png", "dpi": 200},
+    ]
+    for result in render_batch(specs):
+        print(result["output"], result["seconds"])
+
+The specs can also be given on the command line as a JSON file:
+
+    python batch_render.py specs.json --processes 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# the plotting functions are in this directory and docs/exercises
+HERE = os.path.dirname(os.path.abspath(__file__))
+for path in (HERE, os.path.join(HERE, "..", "exercises")):
+    if path not in sys.path:
+        sys.path.append(path)
+
+# the figures kept by each process for reuse, by kind
+_figures = {}
+
+
+def _setup():
+    # worker initializer: pay the cost of importing matplotlib and the
+    # plotting functions once per process
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    import matplotlib.pyplot  # noqa: F401
+    import create_base_color_plot  # noqa: F401
+    import plot_density  # noqa: F401
+
+
+def render_density(spec, fig):
+    """Draw a density map with `plot_density.plot_density`."""
+    import matplotlib.pyplot as plt
+    from plot_density import DensityDescription, load_density, plot_density
+
+    if fig is None:
+        fig = plt.figure()
+
+    # set the size first, as the grid is downsampled to the plot resolution
+    fig.set_size_inches(spec.get("figsize", (6.4, 4.8)))
+
+    density = load_density(spec["data"])
+    description = DensityDescription.read(spec["description"])
+
+    return plot_density(density, description, fig=fig,
+                        fontsize=spec.get("fontsize", 20))
+
+
+def render_colortable(spec, fig):
+    """Draw a colour table with `create_base_color_plot.plot_colortable`.
+    The colours are either a dictionary of names and colours or the name of
+    one of the matplotlib.colors tables, e.g., "BASE_COLORS"."""
+    import matplotlib.colors as mcolors
+    from create_base_color_plot import plot_colortable
+
+    colors = spec["colors"]
+    if isinstance(colors, str):
+        colors = getattr(mcolors, colors)
+
+    return plot_colortable(colors, spec.get("title", ""),
+                           sort_colors=spec.get("sort_colors", True),
+                           emptycols=spec.get("emptycols", 0), fig=fig)
+
+
+# functions drawing each kind of figure: called as function(spec, fig) with
+# a figure to reuse (or None) and return the figure drawn on
+RENDERERS = {
+    "density": render_density,
+    "colortable": render_colortable,
+}
+
+
+def render(spec):
+    """
+    Render one figure spec to its output file, reusing this process's
+    figure for that kind of plot.
+
+    Returns
+    -------
+    dict
+        The "output" file name, the "kind", the time taken in "seconds",
+        whether a figure was "reused", and the "pid" of the process.
+    """
+
+    start = time.perf_counter()
+
+    kind = spec["kind"]
+    if kind not in RENDERERS:
+        raise ValueError(f"Unrecognised figure kind '{kind}'. Kind must be "
+                         f"one of {', '.join(RENDERERS)}.")
+
+    reused = kind in _figures
+    fig = RENDERERS[kind](spec, _figures.get(kind))
+    _figures[kind] = fig
+
+    savekwargs = {"dpi": spec["dpi"]} if "dpi" in spec else {}
+    fig.savefig(spec["output"], **savekwargs)
+
+    return {
+        "output": spec["output"],
+        "kind": kind,
+        "seconds": time.perf_counter() - start,
+        "reused": reused,
+        "pid": os.getpid(),
+    }
+
+
+def render_batch(specs, processes=None):
+    """
+    Render a list of figure specs with a pool of worker processes.
+
+    Parameters
+    ----------
+    specs: list
+        The figure specs.
+    processes: int
+        The number of worker processes. Default is the number of cores. If
+        0, the figures are rendered one after another in this process.
+
+    Returns
+    -------
+    list
+        The result of `render` for each spec, in order.
+    """
+
+    if processes == 0:
+        _setup()
+        return [render(spec) for spec in specs]
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_setup) as executor:
+        return list(executor.map(render, specs))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Render a batch of figures from a JSON list of specs."
+    )
+    parser.add_argument("specs", help="JSON file containing a list of specs")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (0 to render in "
+                        "this process)")
+    args = parser.parse_args(args)
+
+    with open(args.specs, encoding="utf-8") as file:
+        specs = json.load(file)
+
+    start = time.perf_counter()
+    results = render_batch(specs, processes=args.processes)
+    total = time.perf_counter() - start
+
+    for result in results:
+        print(f"{result['output']:40s} {result['kind']:12s} "
+              f"{result['seconds']:8.3f} s"
+              f"{' (reused figure)' if result['reused'] else ''}")
+    print(f"{len(results)} figures in {total:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,9 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
 
-def plot_colortable(colors, title, sort_colors=True, emptycols=0):
-    """Create a colour table."""
+def plot_colortable(colors, title, sort_colors=True, emptycols=0, fig=None):
+    """Create a colour table (on an existing figure, which is cleared and
+    resized, if given)."""
     cell_width = 212
     cell_height = 22
     swatch_width = 48
@@ -34,7 +35,13 @@ def plot_colortable(colors, title, sort_colors=True, emptycols=0):
     height = cell_height * nrows + margin + topmargin
     dpi = 72
 
-    fig, ax = plt.subplots(figsize=(width / dpi, height / dpi), dpi=dpi)
+    if fig is None:
+        fig, ax = plt.subplots(figsize=(width / dpi, height / dpi), dpi=dpi)
+    else:
+        fig.clf()
+        fig.set_dpi(dpi)
+        fig.set_size_inches(width / dpi, height / dpi)
+        ax = fig.add_subplot(111)
     fig.subplots_adjust(margin/width, margin/height,
                         (width-margin)/width, (height-topmargin)/height)
     ax.set_xlim(0, cell_width * 4)
@@ -63,8 +70,9 @@ def plot_colortable(colors, title, sort_colors=True, emptycols=0):
     return fig
 
 
-fig = plot_colortable(mcolors.BASE_COLORS, "Base Colors",
-                      sort_colors=False, emptycols=1)
+if __name__ == "__main__":
+    fig = plot_colortable(mcolors.BASE_COLORS, "Base Colors",
+                          sort_colors=False, emptycols=1)
 
-fig.savefig("basecolors.png", dpi=200)
+    fig.savefig("basecolors.png", dpi=200)
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules under test are exercise solutions in docs/exercises
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "docs", "exercises")
+)
@@ -0,0 +1,76 @@
+import itertools
+import math
+
+import numpy as np
+
+from tictactoe_engine import AlphaBetaPlayer, Board, play_game
+
+
+def minimax(board, depth):
+    """Plain negamax without pruning or a table, scored like
+    `AlphaBetaPlayer.negamax`."""
+    if board.winner is not None:
+        return -AlphaBetaPlayer.WIN
+    if board.isdraw():
+        return 0
+    if depth <= 0:
+        return board.heuristic()
+
+    best = -math.inf
+    for move in board.legal_moves():
+        board.play(*move)
+        best = max(best, AlphaBetaPlayer.shift(-minimax(board, depth - 1)))
+        board.undo()
+    return best
+
+
+def random_boards(gridsize, nboards, maxmoves, seed=0):
+    rng = np.random.default_rng(seed)
+    boards = []
+    while len(boards) < nboards:
+        board = Board(gridsize)
+        for _ in range(rng.integers(maxmoves + 1)):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.play(*moves[rng.integers(len(moves))])
+        if not board.isover():
+            boards.append(board)
+    return boards
+
+
+def test_depth_limited_matches_minimax():
+    for board, depth in itertools.product(random_boards(3, 40, 6),
+                                          (1, 2, 3)):
+        player = AlphaBetaPlayer(maxdepth=depth)
+        value = player.negamax(board, depth, -math.inf, math.inf)
+        assert value == minimax(board, depth)
+
+
+def test_larger_grid_matches_minimax():
+    for board in random_boards(4, 10, 8, seed=1):
+        player = AlphaBetaPlayer(maxdepth=3)
+        value = player.negamax(board, 3, -math.inf, math.inf)
+        assert value == minimax(board, 3)
+
+
+def test_full_search_with_shared_table_matches_minimax():
+    player = AlphaBetaPlayer()
+    for board in random_boards(3, 40, 6, seed=2):
+        value = player.negamax(board, math.inf, -math.inf, math.inf)
+        assert value == minimax(board, math.inf)
+
+
+def test_chosen_move_is_optimal():
+    player = AlphaBetaPlayer(maxdepth=3)
+    for board in random_boards(3, 20, 5, seed=3):
+        player.table.clear()
+        row, col = player(board)
+        board.play(row, col)
+        chosen = AlphaBetaPlayer.shift(-minimax(board, 2))
+        board.undo()
+        assert chosen == minimax(board, 3)
+
+
+def test_perfect_play_draws():
+    assert play_game([AlphaBetaPlayer(), AlphaBetaPlayer()]) == 0